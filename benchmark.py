@@ -0,0 +1,254 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from translate import ArithmeticBackend, ListBackend, TranslationOptions, translate
+from vta_stats import TranslationStats
+
+LIST_SIZES = (10, 100, 1000, 10000)
+RECURSION_DEPTHS = (10, 100, 250)
+HIGHER_ORDER_CALLS = (10, 100)
+READ_COUNTS = (100, 1000, 10000)
+FILTER_SIZES = (100, 1000)
+SORT_SIZES = (100, 1000)
+MAX_TEMPLATE_DEPTH = 4096
+REGRESSION_METRICS = ("translate_s", "compile_s", "peak_rss_kb", "template_depth")
+NOISE_FLOORS = {"translate_s": 0.005, "compile_s": 0.05}
+
+
+def list_workload(size):
+    items = ', '.join(str(i % 97) for i in range(size))
+    source = [
+        "l = list({})".format(items),
+        "twice = num(x: num) -> mul(x, 2)",
+        "null = print(size(l))",
+        "null = print(count(l, 5))",
+        "null = print(get(l, {}))".format(size - 1),
+        "null = print(lieq(map(l, twice), map(l, twice)))",
+        "null = print(size(concat(l, l)))",
+    ]
+    return '\n'.join(source), ""
+
+
+def recursion_workload(depth):
+    source = [
+        "down = num(n: num) -> if(eq(n, 0), 0, down(sub(n, 1)))",
+        "rng = type(n: num) -> tif(eq(n, 0), list(), append(rng(sub(n, 1)), n))",
+        "null = print(down({}))".format(depth),
+        "null = print(size(rng({})))".format(depth),
+    ]
+    return '\n'.join(source), ""
+
+
+def higher_order_workload(calls):
+    source = [
+        "fof = num(a: num, b: num) -> add(mul(a, 2), mul(b, b))",
+        "sof = num(fof: num(a: num, b: num), a: num, b: num) -> fof(fof(a, a), fof(b, b))",
+        "tof = num(sof: num(fof: num(a: num, b: num), a: num, b: num), fof: num(a: num, b: num), a: num, b: num) "
+        "-> sof(fof, mul(a, b), add(a, b))",
+    ]
+    for i in range(calls):
+        source.append("null = print(tof(sof, fof, {}, {}))".format(i % 13, i % 11))
+    return '\n'.join(source), ""
+
+
+def filter_workload(size):
+    source = [
+        "fltr = type(pred: num(x: num), lst: type) -> "
+        "tif(pred(head(lst)), cons(head(lst), fltr(pred, tail(lst))), fltr(pred, tail(lst)))",
+        "fltr(pred, list()) = list()",
+        "sum = num(lst: type) -> if(eq(size(lst), 0), 0, add(head(lst), sum(tail(lst))))",
+        "odd = num(x: num) -> mod(x, 2)",
+        "l = list({})".format(', '.join(str(i * 7 % 1013) for i in range(size))),
+        "null = print(sum(fltr(odd, l)))",
+    ]
+    return '\n'.join(source), ""
+
+
+def sort_workload(size):
+    source = [
+        "l = list({})".format(', '.join(str(i * 7919 % 10007) for i in range(size))),
+        "null = print(get(sort(l), {}))".format(size // 2),
+        "null = print(sum(reverse(l)))",
+    ]
+    return '\n'.join(source), ""
+
+
+def read_workload(count):
+    source = ["s = 0"]
+    for _ in range(count):
+        source.append("s = add(s, read())")
+    source.append("null = print(s)")
+    return '\n'.join(source), ' '.join(str(i % 1000) for i in range(count))
+
+
+def get_workloads():
+    workloads = {}
+    for size in LIST_SIZES:
+        workloads["list_{}".format(size)] = list_workload(size)
+    for depth in RECURSION_DEPTHS:
+        workloads["recursion_{}".format(depth)] = recursion_workload(depth)
+    for calls in HIGHER_ORDER_CALLS:
+        workloads["higher_order_{}".format(calls)] = higher_order_workload(calls)
+    for size in FILTER_SIZES:
+        workloads["filter_{}".format(size)] = filter_workload(size)
+    for size in SORT_SIZES:
+        workloads["sort_{}".format(size)] = sort_workload(size)
+    for count in READ_COUNTS:
+        workloads["read_{}".format(count)] = read_workload(count)
+    return workloads
+
+
+def run_compiler(build_dir, flags):
+    process = subprocess.Popen(
+        ["g++", "--std=c++17"] + flags + ["out.cpp"], cwd=build_dir,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    start = time.perf_counter()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode == 0, time.perf_counter() - start, rusage.ru_maxrss
+
+
+def get_template_depth(build_dir):
+    low, high = 1, MAX_TEMPLATE_DEPTH
+    if not run_compiler(build_dir, ["-fsyntax-only", "-ftemplate-depth={}".format(high)])[0]:
+        return None
+    while low < high:
+        middle = (low + high) // 2
+        if run_compiler(build_dir, ["-fsyntax-only", "-ftemplate-depth={}".format(middle)])[0]:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def run_workload(source, stdin_text, options, repeat, measure_depth):
+    result = {}
+    translate_times = []
+    for _ in range(repeat):
+        stats = TranslationStats()
+        start = time.perf_counter()
+        cpp_code = translate(source, io.StringIO(stdin_text), options, stats)
+        translate_times.append(time.perf_counter() - start)
+    result["translate_s"] = min(translate_times)
+    result["translation"] = stats.as_dict()
+    result["cpp_bytes"] = len(cpp_code)
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        with open(os.path.join(build_dir, "out.cpp"), "w") as cpp_file:
+            cpp_file.write(cpp_code)
+        compile_times = []
+        peak_rss = 0
+        for _ in range(repeat):
+            ok, compile_time, rss = run_compiler(build_dir, ["-o", "program"])
+            if not ok:
+                result["error"] = "compilation failed"
+                return result
+            compile_times.append(compile_time)
+            peak_rss = max(peak_rss, rss)
+        result["compile_s"] = min(compile_times)
+        result["peak_rss_kb"] = peak_rss
+        if measure_depth:
+            result["template_depth"] = get_template_depth(build_dir)
+    return result
+
+
+def get_metadata(options):
+    compiler = subprocess.run(["g++", "--version"], stdout=subprocess.PIPE, universal_newlines=True)
+    return {
+        "compiler": compiler.stdout.split('\n', 1)[0],
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "arithmetic": options.arithmetic.value,
+        "lists": options.lists.value,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, metrics in sorted(results["workloads"].items()):
+        base = baseline.get("workloads", {}).get(name)
+        if base is None:
+            continue
+        for metric in REGRESSION_METRICS:
+            if metrics.get(metric) is None or not base.get(metric):
+                continue
+            ratio = metrics[metric] / base[metric]
+            if ratio > threshold and metrics[metric] - base[metric] > NOISE_FLOORS.get(metric, 0):
+                regressions.append("{} {}: {:.4g} -> {:.4g} ({:+.0%})".format(
+                    name, metric, base[metric], metrics[metric], ratio - 1
+                ))
+    return regressions
+
+
+def format_results(results):
+    rows = ["{:<18} {:>11} {:>10} {:>12} {:>6} {:>10}".format(
+        "workload", "translate s", "g++ s", "peak RSS KB", "depth", "cpp bytes"
+    )]
+    for name, metrics in results["workloads"].items():
+        if "error" in metrics:
+            rows.append("{:<18} {}".format(name, metrics["error"]))
+            continue
+        rows.append("{:<18} {:>11.4f} {:>10.3f} {:>12} {:>6} {:>10}".format(
+            name, metrics["translate_s"], metrics["compile_s"], metrics["peak_rss_kb"],
+            metrics.get("template_depth") or "-", metrics["cpp_bytes"],
+        ))
+    return '\n'.join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure translation time, g++ time, g++ peak RSS and template depth on generated workloads."
+    )
+    parser.add_argument("-k", "--filter", default="", help="only run workloads whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=1, help="take the minimum time of this many runs")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against results previously saved with --output")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2, help="report a regression when a metric exceeds baseline * THRESHOLD"
+    )
+    parser.add_argument("--skip-depth", action="store_true", help="do not search for the template instantiation depth")
+    parser.add_argument(
+        "--arithmetic",
+        choices=[backend.value for backend in ArithmeticBackend],
+        default=ArithmeticBackend.STRUCT.value,
+    )
+    parser.add_argument(
+        "--lists",
+        choices=[backend.value for backend in ListBackend],
+        default=ListBackend.PACK.value,
+    )
+    args = parser.parse_args()
+    options = TranslationOptions(arithmetic=ArithmeticBackend(args.arithmetic), lists=ListBackend(args.lists))
+
+    results = {"meta": get_metadata(options), "workloads": {}}
+    for name, (source, stdin_text) in get_workloads().items():
+        if args.filter not in name:
+            continue
+        print("running {}...".format(name), file=sys.stderr)
+        results["workloads"][name] = run_workload(source, stdin_text, options, args.repeat, not args.skip_depth)
+    print(format_results(results))
+
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+            output_file.write("\n")
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print("\nRegressions against {}:".format(args.baseline))
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against {}".format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+import os
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict, namedtuple
+
+from translate import (
+    BUILT_IN_IDENTIFIERS, DEFAULT_OPTIONS, FOLDING_FUNCS, LLONG_MAX, LLONG_MIN, FuncLitSpecArgType, LineType,
+    RvalueType, VariableType, build_cpp_code, compile_file, parse_program, purify_name, resolve_imports,
+)
+
+DEFAULT_CACHE_SIZE = 1 << 16
+RECURSION_LIMIT = 10 ** 4
+NAN_VALUE = -9223372036854775807
+
+FunctionValue = namedtuple("FunctionValue", ["name"])
+
+
+class EvaluationError(Exception):
+    pass
+
+
+def numeric(value):
+    if not isinstance(value, int):
+        raise EvaluationError("Expected a numeric value, got {}".format(value))
+    if not LLONG_MIN <= value <= LLONG_MAX:
+        raise EvaluationError("long long overflow")
+    return value
+
+
+def sequence(value):
+    if not isinstance(value, tuple):
+        raise EvaluationError("Expected a list, got {}".format(value))
+    return value
+
+
+def struct_pow(x, n):
+    if n < 0:
+        raise EvaluationError("pow with a negative exponent does not terminate")
+    if n == 0:
+        return 1
+    if n == 1:
+        return x
+    return numeric(struct_pow(numeric(x * x), n // 2) * (x if n % 2 else 1))
+
+
+def get_item(lst, i):
+    return lst[i] if 0 <= i < len(lst) else NAN_VALUE
+
+
+def head(lst):
+    if not lst:
+        raise EvaluationError("head of an empty list")
+    return lst[0]
+
+
+def tail(lst):
+    if not lst:
+        raise EvaluationError("tail of an empty list")
+    return lst[1:]
+
+
+def checked_sum(lst):
+    result = 0
+    for item in lst:
+        result = numeric(result + item)
+    return result
+
+
+def zip_items(a, b):
+    return tuple(item for pair in zip(a, b) for item in pair)
+
+
+LIST_FUNCS = {
+    'list': lambda *items: tuple(numeric(item) for item in items),
+    'head': lambda lst: head(sequence(lst)),
+    'tail': lambda lst: tail(sequence(lst)),
+    'size': lambda lst: len(sequence(lst)),
+    'cons': lambda h, lst: (numeric(h),) + sequence(lst),
+    'append': lambda lst, h: sequence(lst) + (numeric(h),),
+    'concat': lambda a, b: sequence(a) + sequence(b),
+    'lieq': lambda a, b: int(sequence(a) == sequence(b)),
+    'count': lambda lst, x: sequence(lst).count(numeric(x)),
+    'contains': lambda lst, x: int(numeric(x) in sequence(lst)),
+    'get': lambda lst, i: get_item(sequence(lst), numeric(i)),
+    'range': lambda a, b: tuple(range(numeric(a), numeric(b))),
+    'sum': lambda lst: checked_sum(sequence(lst)),
+    'sort': lambda lst: tuple(sorted(sequence(lst))),
+    'reverse': lambda lst: sequence(lst)[::-1],
+    'zip': lambda a, b: zip_items(sequence(a), sequence(b)),
+}
+
+
+class Evaluator:
+    def __init__(self, code_lines, cache_size=DEFAULT_CACHE_SIZE):
+        self.code_lines = code_lines
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.globals = {}
+        self.functional_literals = {}
+        self.specializations = {}
+        self.patterns = {}
+        for line_type, atomic_obj, _ in code_lines:
+            if line_type == LineType.FUNC_LIT:
+                self.functional_literals[atomic_obj.name] = atomic_obj
+                self.specializations.setdefault(atomic_obj.name, [])
+            elif line_type == LineType.FUNC_LIT_SPECIALIZATION:
+                self.specializations.setdefault(atomic_obj.name, []).append(atomic_obj)
+
+    def run(self):
+        output = []
+        for line_type, atomic_obj, _ in self.code_lines:
+            if line_type != LineType.ASSIGNMENT:
+                continue
+            if atomic_obj.left_op == 'null':
+                output.append(self.print_line(atomic_obj.right_op))
+            else:
+                self.globals[atomic_obj.left_op] = self.evaluate(atomic_obj.right_op, {})
+        return ''.join(output)
+
+    def print_line(self, right_op):
+        if right_op.type != RvalueType.CALL or right_op.value.identifier != 'print':
+            raise EvaluationError("Only print can be assigned to null")
+        if len(right_op.value.arguments) != 1:
+            raise EvaluationError("print takes exactly one argument")
+        value = self.evaluate(right_op.value.arguments[0], {})
+        if isinstance(value, tuple):
+            return ''.join("{} ".format(item) for item in value) + "\n"
+        return "{}\n".format(numeric(value))
+
+    def evaluate(self, rvalue, env):
+        if rvalue.type == RvalueType.NUMERIC_LITERAL:
+            return numeric(int(rvalue.value.value))
+        elif rvalue.type == RvalueType.VARIABLE_VALUE:
+            if rvalue.variable_type == VariableType.FUNCTION_NOT_SET:
+                return FunctionValue(purify_name(rvalue.value.name))
+            if rvalue.value.name not in self.globals:
+                raise EvaluationError("Unknown variable '{}'".format(rvalue.value.name))
+            return self.globals[rvalue.value.name]
+        elif rvalue.type == RvalueType.LOCAL_VARIABLE:
+            if rvalue.value.name not in env:
+                raise EvaluationError("Unbound local variable '{}'".format(rvalue.value.name))
+            return env[rvalue.value.name]
+        return self.evaluate_call(rvalue, env)
+
+    def evaluate_call(self, rvalue, env):
+        identifier = rvalue.value.identifier
+        arguments = rvalue.value.arguments
+        if identifier in BUILT_IN_IDENTIFIERS and rvalue.local_type is None \
+                and identifier not in self.functional_literals:
+            if identifier in ('if', 'tif'):
+                if len(arguments) != 3:
+                    raise EvaluationError("{} takes three arguments".format(identifier))
+                branch = arguments[1] if numeric(self.evaluate(arguments[0], env)) else arguments[2]
+                return self.evaluate(branch, env)
+            args = [self.evaluate(arg, env) for arg in arguments]
+            return self.call_built_in(identifier, args)
+        args = tuple(self.evaluate(arg, env) for arg in arguments)
+        if rvalue.local_type is not None:
+            function = env.get(identifier)
+            if not isinstance(function, FunctionValue):
+                raise EvaluationError("'{}' is not a function".format(identifier))
+            return self.call(function.name, args)
+        return self.call(identifier, args)
+
+    def call_built_in(self, identifier, args):
+        try:
+            if identifier in FOLDING_FUNCS:
+                if identifier == 'pow':
+                    return struct_pow(*map(numeric, args))
+                value = FOLDING_FUNCS[identifier](*map(numeric, args))
+                if value is None:
+                    raise EvaluationError("{}{} is not a constant expression".format(identifier, tuple(args)))
+                return numeric(value)
+            if identifier in ('map', 'filter'):
+                lst, function = args
+                if not isinstance(function, FunctionValue):
+                    raise EvaluationError("{} expects a function".format(identifier))
+                if identifier == 'filter':
+                    return tuple(item for item in sequence(lst) if numeric(self.call(function.name, (item,))))
+                return tuple(numeric(self.call(function.name, (item,))) for item in sequence(lst))
+            if identifier == 'fold':
+                lst, function, result = args
+                if not isinstance(function, FunctionValue):
+                    raise EvaluationError("fold expects a function")
+                for item in sequence(lst):
+                    result = numeric(self.call(function.name, (numeric(result), item)))
+                return numeric(result)
+            if identifier in LIST_FUNCS:
+                return LIST_FUNCS[identifier](*args)
+        except (TypeError, ValueError):
+            raise EvaluationError("Wrong number of arguments for '{}'".format(identifier))
+        raise EvaluationError("Built-in '{}' is not supported by the evaluator".format(identifier))
+
+    def call(self, name, args):
+        key = (name, args)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if name not in self.functional_literals:
+            raise EvaluationError("Unknown functional literal '{}'".format(name))
+        func_lit = self.functional_literals[name]
+        if len(args) != len(func_lit.args):
+            raise EvaluationError("Wrong number of arguments for '{}'".format(name))
+        body, env = self.match_specialization(name, args)
+        if body is None:
+            body, env = func_lit.rvalue, dict(zip(func_lit.args, args))
+        try:
+            result = self.evaluate(body, env)
+        except RecursionError:
+            raise EvaluationError("Recursion is too deep")
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def get_pattern(self, spec):
+        pattern = self.patterns.get(id(spec))
+        if pattern is None:
+            pattern = [
+                (True, self.evaluate(parameter.value, {})) if parameter.type == FuncLitSpecArgType.RVALUE
+                else (False, parameter.value.name)
+                for parameter in spec.parameters
+            ]
+            self.patterns[id(spec)] = pattern
+        return pattern
+
+    def match_specialization(self, name, args):
+        matches = []
+        for spec in self.specializations[name]:
+            pattern = self.get_pattern(spec)
+            if len(pattern) != len(args):
+                raise EvaluationError("Wrong number of parameters in a specialization of '{}'".format(name))
+            env = {}
+            for (fixed, value), arg in zip(pattern, args):
+                if fixed and value != arg:
+                    break
+                if not fixed:
+                    if value in env and env[value] != arg:
+                        break
+                    env[value] = arg
+            else:
+                fixed_positions = {i for i, (fixed, _) in enumerate(pattern) if fixed}
+                matches.append((fixed_positions, spec.rvalue, env))
+        if not matches:
+            return None, None
+        for fixed_positions, body, env in matches:
+            if all(other <= fixed_positions for other, _, _ in matches):
+                return body, env
+        raise EvaluationError("Ambiguous specializations of '{}'".format(name))
+
+
+def evaluate(code_lines, cache_size=DEFAULT_CACHE_SIZE):
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, RECURSION_LIMIT))
+    try:
+        return Evaluator(code_lines, cache_size).run()
+    except RecursionError:
+        raise EvaluationError("Recursion is too deep")
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+
+def run_program(source_path, stdin, options=DEFAULT_OPTIONS, cache_size=DEFAULT_CACHE_SIZE):
+    with open(source_path) as source_file:
+        source, options = resolve_imports(source_file.read(), options)
+    variables, code_lines, functional_literals = parse_program(source, stdin, options)
+    try:
+        output = evaluate(code_lines, cache_size)
+    except EvaluationError as e:
+        print("Falling back to g++: {}".format(e), file=sys.stderr)
+    else:
+        sys.stdout.write(output)
+        return 0
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        cpp_path = os.path.join(build_dir, "out.cpp")
+        with open(cpp_path, "w") as cpp_file:
+            cpp_file.write(build_cpp_code(variables, code_lines, functional_literals, options))
+        _, binary_path, error = compile_file(source_path, cpp_path)
+        if error is not None:
+            print(error, file=sys.stderr)
+            return 1
+        sys.stdout.flush()
+        return subprocess.run([binary_path]).returncode
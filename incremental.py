@@ -0,0 +1,220 @@
+import bisect
+import copy
+import heapq
+import io
+from collections import defaultdict
+
+from translate import (
+    DEFAULT_OPTIONS, LineType, LocalVariableType, Variable, assemble_cpp_code, check_types, fold_code_line,
+    get_code_line, get_code_lines, get_func_lit_spec_name, get_line_type, get_live_lines, get_specializations,
+    get_variables, init_variables, lex, lower_code_line, lower_list_recursion, parse_code_line, preparse_func_literals,
+    translate_code_line,
+)
+from utils import TokenReader
+
+INPUT_IDENTIFIERS = {'read', 'readlist'}
+
+
+def get_identifiers(raw_code_line):
+    identifiers = set()
+    for token in lex(raw_code_line.left_op) + lex(raw_code_line.right_op):
+        if token.value[0].isalpha():
+            identifiers.add(token.value)
+    return identifiers
+
+
+def get_defined_name(raw_code_line):
+    if get_line_type(raw_code_line) == LineType.FUNC_LIT_SPECIALIZATION:
+        return get_func_lit_spec_name(raw_code_line.left_op)
+    return raw_code_line.left_op
+
+
+class IncrementalTranslation:
+    def __init__(self, source, stdin_text="", options=DEFAULT_OPTIONS):
+        self.stdin_text = stdin_text
+        self.options = options
+        self.build(source)
+
+    def build(self, source):
+        self.code_lines = None
+        raw_code_lines = get_code_lines(source)
+        self.variable_kinds = get_variables(raw_code_lines)
+        self.variables = init_variables(raw_code_lines)
+        self.func_lit_types = preparse_func_literals(raw_code_lines)
+        self.functional_literals = {}
+        stdin = TokenReader(io.StringIO(self.stdin_text))
+        code_lines = [
+            parse_code_line(self.variables, self.func_lit_types, self.functional_literals, raw_code_line, stdin, i)
+            for i, raw_code_line in enumerate(raw_code_lines)
+        ]
+        if self.options.check_types:
+            check_types(code_lines)
+        self.constants = {}
+        if self.options.fold_constants:
+            for code_line in code_lines:
+                fold_code_line(code_line, self.constants, self.func_lit_types)
+        if self.options.lower_recursion:
+            code_lines = lower_list_recursion(code_lines)
+
+        self.raw_code_lines = raw_code_lines
+        self.source_line_count = source.count('\n') + 1
+        self.indices = {raw_code_line.line_number: i for i, raw_code_line in enumerate(raw_code_lines)}
+        self.uses = [get_identifiers(raw_code_line) for raw_code_line in raw_code_lines]
+        self.users = defaultdict(set)
+        for i, names in enumerate(self.uses):
+            for name in names:
+                self.users[name].add(i)
+        self.assignment_lines = defaultdict(list)
+        for i, code_line in enumerate(code_lines):
+            if code_line.line_type == LineType.ASSIGNMENT:
+                self.assignment_lines[raw_code_lines[i].left_op].append(i)
+        self.chunks = [
+            translate_code_line(self.variables, self.func_lit_types, code_line, self.options)
+            for code_line in code_lines
+        ]
+        self.code_lines = code_lines
+
+    @property
+    def cpp(self):
+        chunks = self.chunks
+        if self.options.eliminate_dead_code:
+            live = get_live_lines(self.code_lines)
+            chunks = [chunk for i, chunk in enumerate(chunks) if i in live]
+        body_code = [body for body, _ in chunks if body is not None]
+        main_func_code = [main_func for _, main_func in chunks if main_func is not None]
+        return assemble_cpp_code(body_code, main_func_code, self.options)
+
+    def update(self, source, edited_lines=None):
+        if self.code_lines is None:
+            self.build(source)
+            return self
+        changed = self.get_changed_lines(source, edited_lines)
+        if changed is None:
+            self.build(source)
+            return self
+        try:
+            self.reparse(changed)
+        except Exception:
+            self.code_lines = None
+            raise
+        return self
+
+    def get_changed_lines(self, source, edited_lines):
+        if edited_lines is None:
+            raw_code_lines = get_code_lines(source)
+            if [raw.line_number for raw in raw_code_lines] != [raw.line_number for raw in self.raw_code_lines]:
+                return None
+            edited = {
+                i: raw_code_line for i, raw_code_line in enumerate(raw_code_lines)
+                if raw_code_line != self.raw_code_lines[i]
+            }
+        else:
+            splitted_source = source.split('\n')
+            if len(splitted_source) != self.source_line_count:
+                return None
+            edited = {}
+            for line_number in edited_lines:
+                raw_code_line = get_code_line(splitted_source[line_number - 1], line_number - 1)
+                i = self.indices.get(line_number)
+                if (raw_code_line is None) != (i is None):
+                    return None
+                if raw_code_line is not None and raw_code_line != self.raw_code_lines[i]:
+                    edited[i] = raw_code_line
+
+        for i, raw_code_line in edited.items():
+            if not self.is_local_edit(self.raw_code_lines[i], raw_code_line):
+                return None
+        for i, raw_code_line in edited.items():
+            self.raw_code_lines[i] = raw_code_line
+        return sorted(edited)
+
+    @staticmethod
+    def is_local_edit(old, new):
+        if get_line_type(old) != get_line_type(new) or get_defined_name(old) != get_defined_name(new):
+            return False
+        if INPUT_IDENTIFIERS & (get_identifiers(old) | get_identifiers(new)):
+            return False
+        return preparse_func_literals([old]) == preparse_func_literals([new])
+
+    def variables_at(self, index, names):
+        variables = {}
+        for name in names:
+            if name not in self.variable_kinds:
+                continue
+            variable = Variable(name, LocalVariableType.get_by(self.variable_kinds[name]))
+            assignment_lines = self.assignment_lines.get(name, ())
+            variable.count = bisect.bisect_left(assignment_lines, index)
+            if variable.count:
+                variable.type = self.code_lines[assignment_lines[variable.count - 1]].object.right_op.variable_type
+            variables[name] = variable
+        return variables
+
+    def reparse(self, changed):
+        pending = list(changed)
+        heapq.heapify(pending)
+        queued = set(changed)
+        retranslate = set()
+        func_lit_names = set()
+        while pending:
+            i = heapq.heappop(pending)
+            raw_code_line = self.raw_code_lines[i]
+            old_code_line = self.code_lines[i]
+
+            uses = get_identifiers(raw_code_line)
+            for name in self.uses[i] - uses:
+                self.users[name].discard(i)
+            for name in uses - self.uses[i]:
+                self.users[name].add(i)
+            self.uses[i] = uses
+
+            code_line = parse_code_line(
+                self.variables_at(i, uses), self.func_lit_types, self.functional_literals, raw_code_line,
+                io.StringIO(), i
+            )
+            if code_line.line_type == LineType.ASSIGNMENT:
+                old_constant = self.constants.get(code_line.object.left_op)
+            if self.options.fold_constants:
+                fold_code_line(code_line, self.constants, self.func_lit_types)
+            self.code_lines[i] = code_line
+            retranslate.add(i)
+
+            name = get_defined_name(raw_code_line)
+            if code_line.line_type != LineType.ASSIGNMENT:
+                func_lit_names.add(name)
+            dependents = set()
+            if code_line.line_type == LineType.ASSIGNMENT:
+                new_type = code_line.object.right_op.variable_type
+                if new_type != old_code_line.object.right_op.variable_type:
+                    dependents = {j for j in self.users[name] if j > i}
+                    if self.assignment_lines[name][-1] == i:
+                        self.variables = dict(self.variables)
+                        self.variables[name] = copy.copy(self.variables[name])
+                        self.variables[name].type = new_type
+                        retranslate |= self.users[name]
+                elif self.constants.get(code_line.object.left_op) != old_constant:
+                    dependents = {j for j in self.users[name] if j > i}
+            elif code_line.line_type == LineType.FUNC_LIT:
+                if code_line.object.args != old_code_line.object.args:
+                    dependents = {
+                        j for j in self.users[name]
+                        if j > i and self.code_lines[j].line_type == LineType.FUNC_LIT_SPECIALIZATION
+                    }
+            for j in dependents - queued:
+                queued.add(j)
+                heapq.heappush(pending, j)
+
+        if self.options.check_types:
+            check_types(self.code_lines)
+        if self.options.lower_recursion and func_lit_names:
+            specializations = get_specializations(self.code_lines)
+            for i, code_line in enumerate(self.code_lines):
+                if code_line.line_type == LineType.FUNC_LIT and code_line.object.name in func_lit_names:
+                    self.code_lines[i] = lower_code_line(code_line, specializations)
+                    retranslate.add(i)
+
+        for i in retranslate:
+            self.chunks[i] = translate_code_line(self.variables, self.func_lit_types, self.code_lines[i], self.options)
+
+
+def retranslate(previous, source, edited_lines=None):
+    return previous.update(source, edited_lines)
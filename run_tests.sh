@@ -1,7 +1,14 @@
 #!/bin/bash
 
-python3 translate.py test.vta>out.cpp
-g++ --std=c++17 out.cpp -o tests
-./tests
-rm out.cpp
-rm tests
+python3 -m unittest discover -q -p "test_*.py" || exit 1
+
+build_dir=$(mktemp -d)
+trap 'rm -rf "$build_dir"' EXIT
+python3 translate.py test.vta > "$build_dir/single.cpp" && g++ --std=c++17 "$build_dir/single.cpp" -o "$build_dir/single" || exit 1
+python3 translate.py test.vta --split 3 --compile --output-dir "$build_dir/parts" > /dev/null || exit 1
+if ! cmp -s <("$build_dir/single") <("$build_dir/parts/program"); then
+    echo "test.vta built with --split 3 prints something else than the single-file build"
+    exit 1
+fi
+
+python3 vta_test.py test.vta --evaluate "$@"
@@ -0,0 +1,119 @@
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+
+from translate import (
+    ArithmeticBackend, ListBackend, ParsingError, TranslationError, TranslationOptions, read_template, split_imports,
+    translate,
+)
+
+TEMPLATE_FILES = ("vta_header.cpp", "vta_stdlib.cpp", "main_func.cpp")
+
+
+class RequestError(Exception):
+    pass
+
+
+def get_options(raw_options):
+    if not isinstance(raw_options, dict):
+        raise RequestError("'options' must be an object")
+    try:
+        arithmetic = ArithmeticBackend(raw_options.get("arithmetic", ArithmeticBackend.STRUCT.value))
+    except ValueError:
+        raise RequestError("Unknown arithmetic backend: '{}'".format(raw_options["arithmetic"]))
+    try:
+        lists = ListBackend(raw_options.get("lists", ListBackend.PACK.value))
+    except ValueError:
+        raise RequestError("Unknown list backend: '{}'".format(raw_options["lists"]))
+    return TranslationOptions(arithmetic=arithmetic, lists=lists, stdlib_include=raw_options.get("stdlib_include"))
+
+
+def check_imports(source):
+    # Requests come from clients, not from the server's disk: they may only import modules below its directory.
+    for line_number, name in split_imports(source)[1]:
+        if os.path.isabs(name) or os.pardir in name.replace(os.sep, "/").split("/"):
+            error = RequestError("Requests can only import modules by a relative path without '..': '{}'".format(name))
+            error.line_number = line_number
+            raise error
+
+
+def handle_request(raw_request):
+    request_id = None
+    try:
+        try:
+            request = json.loads(raw_request)
+        except ValueError as e:
+            raise RequestError("Invalid JSON: {}".format(e))
+        if not isinstance(request, dict):
+            raise RequestError("Request must be a JSON object")
+        request_id = request.get("id")
+        if not isinstance(request.get("source"), str):
+            raise RequestError("'source' must be a string")
+        check_imports(request["source"])
+        options = get_options(request.get("options", {}))
+        cpp_code = translate(request["source"], io.StringIO(request.get("input", "")), options)
+    except (RequestError, ParsingError, TranslationError) as e:
+        return {
+            "id": request_id,
+            "error": {"type": type(e).__name__, "message": str(e), "line": getattr(e, "line_number", None)},
+        }
+    except Exception as e:
+        # one pathological request (e.g. RecursionError on a very deep expression) must not take the daemon down
+        return {"id": request_id, "error": {"type": type(e).__name__, "message": str(e), "line": None}}
+    return {"id": request_id, "cpp": cpp_code}
+
+
+class TranslationRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw_request in self.rfile:
+            if not raw_request.strip():
+                continue
+            response = handle_request(raw_request.decode())
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+
+class TranslationServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve_stdio():
+    for raw_request in sys.stdin:
+        if not raw_request.strip():
+            continue
+        print(json.dumps(handle_request(raw_request)), flush=True)
+
+
+def serve_socket(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with TranslationServer(path, TranslationRequestHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translation daemon: answers JSON-lines requests {\"id\", \"source\", \"input\", \"options\"} "
+                    "with {\"id\", \"cpp\"} or {\"id\", \"error\"}."
+    )
+    parser.add_argument("--socket", metavar="PATH", help="listen on a Unix socket instead of stdin/stdout")
+    args = parser.parse_args()
+    for template in TEMPLATE_FILES:
+        read_template(template)
+    if args.socket is None:
+        serve_stdio()
+    else:
+        serve_socket(args.socket)
+
+
+if __name__ == '__main__':
+    main()
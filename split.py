@@ -0,0 +1,155 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from translate import (
+    DEFAULT_OPTIONS, LineType, get_code_line_name, get_prelude, get_referenced_names, parse_program, read_template,
+    resolve_imports, translate_code_line, translate_output,
+)
+
+HEADER_NAME = "vta_program.hpp"
+MAKEFILE_TEMPLATE = """CXX ?= g++
+CXXFLAGS ?= --std=c++17
+OBJECTS = {objects}
+
+program: $(OBJECTS)
+\t$(CXX) $(CXXFLAGS) $(OBJECTS) -o program
+
+%.o: %.cpp {header}
+\t$(CXX) $(CXXFLAGS) -c $< -o $@
+
+clean:
+\trm -f $(OBJECTS) program
+"""
+
+
+def get_dependencies(code_lines):
+    definitions = defaultdict(list)
+    for i, code_line in enumerate(code_lines):
+        name = get_code_line_name(code_line)
+        if name != 'null':
+            definitions[name].append(i)
+    return [
+        {j for name in get_referenced_names(code_line) for j in definitions.get(name, ())}
+        for code_line in code_lines
+    ]
+
+
+def get_shared_lines(code_lines, dependencies):
+    pending = [i for i, code_line in enumerate(code_lines) if code_line.line_type != LineType.ASSIGNMENT]
+    shared = set(pending)
+    while pending:
+        for j in dependencies[pending.pop()]:
+            if j not in shared:
+                shared.add(j)
+                pending.append(j)
+    return shared
+
+
+def get_components(dependencies, shared):
+    parents = list(range(len(dependencies)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for i, line_dependencies in enumerate(dependencies):
+        if i in shared:
+            continue
+        for j in line_dependencies:
+            if j not in shared:
+                parents[find(i)] = find(j)
+    components = defaultdict(list)
+    for i in range(len(dependencies)):
+        if i not in shared:
+            components[find(i)].append(i)
+    return list(components.values())
+
+
+def partition(components, costs, parts):
+    bins = [[] for _ in range(parts)]
+    loads = [0] * parts
+    for component in sorted(components, key=lambda component: -sum(costs[i] for i in component)):
+        k = loads.index(min(loads))
+        bins[k].extend(component)
+        loads[k] += sum(costs[i] for i in component)
+    return [sorted(lines) for lines in bins if lines]
+
+
+def split_cpp_code(variables, code_lines, functional_literals, parts, options=DEFAULT_OPTIONS):
+    chunks = [translate_code_line(variables, functional_literals, code_line, options) for code_line in code_lines]
+    chunks = [(body, main_func and translate_output([main_func])) for body, main_func in chunks]
+    dependencies = get_dependencies(code_lines)
+    shared = get_shared_lines(code_lines, dependencies)
+    costs = [sum(len(code) for code in chunk if code is not None) for chunk in chunks]
+
+    code = [code for chunk in chunks for code in chunk if code is not None]
+    header = get_prelude(code, options) + [chunks[i][0] for i in sorted(shared)]
+    files = {HEADER_NAME: "#pragma once\n" + '\n'.join(header) + "\n"}
+    for k, lines in enumerate(partition(get_components(dependencies, shared), costs, parts)):
+        part = ['#include "{}"\n'.format(HEADER_NAME)]
+        for i in lines:
+            body, main_func = chunks[i]
+            if body is not None:
+                part.append(body)
+            if main_func is not None:
+                part.append("void __vta_print_{}() {{\n{}\n}}\n".format(i, main_func))
+        files["part_{}.cpp".format(k)] = '\n'.join(part)
+
+    prints = [i for i, (_, main_func) in enumerate(chunks) if main_func is not None]
+    declarations = ''.join("void __vta_print_{}();\n".format(i) for i in prints)
+    calls = '\n'.join("    __vta_print_{}();".format(i) for i in prints)
+    files["main.cpp"] = declarations + "\n" + read_template("main_func.cpp").format(calls)
+    objects = ' '.join(os.path.splitext(name)[0] + ".o" for name in sorted(files) if name.endswith(".cpp"))
+    files["Makefile"] = MAKEFILE_TEMPLATE.format(objects=objects, header=HEADER_NAME)
+    return files
+
+
+def compile_object(output_dir, cpp_name):
+    process = subprocess.run(
+        ["g++", "--std=c++17", "-c", cpp_name, "-o", os.path.splitext(cpp_name)[0] + ".o"], cwd=output_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+    )
+    return cpp_name, process.stdout if process.returncode != 0 else None
+
+
+def compile_split(output_dir, cpp_names, jobs):
+    with ThreadPoolExecutor(jobs) as compilers:
+        for cpp_name, error in compilers.map(lambda cpp_name: compile_object(output_dir, cpp_name), cpp_names):
+            if error is not None:
+                return "{}: compilation failed\n{}".format(cpp_name, error)
+    objects = [os.path.splitext(cpp_name)[0] + ".o" for cpp_name in cpp_names]
+    process = subprocess.run(
+        ["g++", "--std=c++17"] + objects + ["-o", "program"], cwd=output_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+    )
+    return process.stdout if process.returncode != 0 else None
+
+
+def run_split(source_path, stdin, parts, output_dir=None, compile_outputs=False, jobs=None,
+              options=DEFAULT_OPTIONS):
+    if output_dir is None:
+        output_dir = os.path.splitext(source_path)[0] + "_parts"
+    with open(source_path) as source_file:
+        source, options = resolve_imports(source_file.read(), options)
+    variables, code_lines, functional_literals = parse_program(source, stdin, options)
+    files = split_cpp_code(variables, code_lines, functional_literals, parts, options)
+    os.makedirs(output_dir, exist_ok=True)
+    for name, content in files.items():
+        with open(os.path.join(output_dir, name), "w") as output_file:
+            output_file.write(content)
+
+    cpp_names = sorted(name for name in files if name.endswith(".cpp"))
+    if compile_outputs:
+        error = compile_split(output_dir, cpp_names, jobs or len(cpp_names))
+        if error is not None:
+            print(error, file=sys.stderr)
+            return 1
+        print("{} -> {}".format(source_path, os.path.join(output_dir, "program")))
+    else:
+        print("{} -> {} ({})".format(source_path, output_dir, ', '.join(cpp_names)))
+    return 0
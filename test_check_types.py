@@ -0,0 +1,49 @@
+import io
+import unittest
+
+from translate import TranslationError, translate
+
+
+class CheckTypesTest(unittest.TestCase):
+    def assert_rejected(self, source, message):
+        with self.assertRaises(TranslationError) as context:
+            translate(source, io.StringIO())
+        self.assertTrue(str(context.exception).startswith(message), str(context.exception))
+        self.assertEqual(context.exception.line_number, int(message.split()[1].rstrip(':')))
+
+    def test_builtin_argument(self):
+        self.assert_rejected(
+            "x = 1\ny = add(x, list(1))\nnull = print(y)", "line 2: argument 2 of 'add' must be num, got type"
+        )
+        self.assert_rejected(
+            "l = list(1, 2)\nnull = print(head(1))", "line 2: argument 1 of 'head' must be type, got num"
+        )
+
+    def test_literal_arguments(self):
+        self.assert_rejected(
+            "f = num(x: num) -> add(x, 1)\nnull = print(f(list(1)))", "line 2: argument 1 of 'f' must be num, got type"
+        )
+        self.assert_rejected(
+            "f = num(x: num) -> add(x, 1)\nnull = print(f(1, 2))", "line 2: wrong number of arguments to 'f'"
+        )
+
+    def test_function_argument(self):
+        self.assert_rejected(
+            "g = num(h: num(x: num), y: num) -> h(y)\nk = num(a: num, b: num) -> add(a, b)\nnull = print(g(k, 1))",
+            "line 3: argument 1 of 'g' must be num(x: num), got num(a: num, b: num)",
+        )
+
+    def test_specialization_body(self):
+        self.assert_rejected(
+            "f = num(x: num, l: type) -> x\nf(0, list()) = list()\nnull = print(f(1, list()))",
+            "line 2: body of 'f(0, list())' must be num, got type",
+        )
+
+    def test_valid_programs(self):
+        with open("test.vta") as source_file:
+            translate(source_file.read(), io.StringIO())
+        translate("f = num(x: num) -> add(x, 1)\nnull = print(f(2))", io.StringIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import io
+import unittest
+
+from incremental import IncrementalTranslation
+from translate import translate
+
+
+def replace_line(source, old, new):
+    lines = source.split('\n')
+    i = lines.index(old)
+    return '\n'.join(lines[:i] + [new] + lines[i + 1:]), i + 1
+
+
+class IncrementalTranslationTest(unittest.TestCase):
+    def setUp(self):
+        with open("test.vta") as source_file:
+            self.source = source_file.read()
+
+    def check_edit(self, old, new):
+        source, line_number = replace_line(self.source, old, new)
+        translation = IncrementalTranslation(self.source)
+        translation.update(source, [line_number])
+        self.assertEqual(translation.cpp, translate(source, io.StringIO()))
+
+    def test_edit_literal(self):
+        self.check_edit("last = 10", "last = 12")
+
+    def test_edit_type(self):
+        self.check_edit("b = a", "b = list(1, 2)")
+
+    def test_edit_signature(self):
+        self.check_edit("p = num(x: num) -> mod(x, 2)", "p = num(y: num) -> mod(y, 3)")
+
+    def test_edits_in_sequence(self):
+        translation = IncrementalTranslation(self.source)
+        source = self.source
+        for old, new in [("last = 10", "last = 12"), ("b = a", "b = list(1, 2)"), ("a = 1", "a = 7")]:
+            source, line_number = replace_line(source, old, new)
+            translation.update(source, [line_number])
+            self.assertEqual(translation.cpp, translate(source, io.StringIO()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from translate import TranslationError, translate
+from utils import CHUNK_SIZE, TokenReader, read_next_token
+
+# the token "123456" starts two characters before the first chunk boundary
+SPLIT_TOKEN_INPUT = "7 " * (CHUNK_SIZE // 2 - 1) + "123456 9\n"
+
+
+class TokenReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_input(self, text):
+        path = os.path.join(self.directory.name, "input.txt")
+        with open(path, "w") as input_file:
+            input_file.write(text)
+        return path
+
+    def check_split_token(self, reader):
+        tokens = reader.next_tokens()
+        self.assertEqual(len(tokens), CHUNK_SIZE // 2 + 1)
+        self.assertEqual(tokens[-2:], ["123456", "9"])
+
+    def test_token_across_chunk_boundary(self):
+        self.check_split_token(TokenReader(io.StringIO(SPLIT_TOKEN_INPUT)))
+
+    def test_mapped_reader(self):
+        self.check_split_token(TokenReader.from_path(self.write_input(SPLIT_TOKEN_INPUT)))
+        self.assertEqual(TokenReader.from_path(self.write_input("")).next_tokens(), [])
+
+    def test_mixed_reads(self):
+        text = " 1\n-2  3 4 "
+        for reader in (TokenReader(io.StringIO(text)), TokenReader.from_path(self.write_input(text))):
+            self.assertEqual(read_next_token(reader), "1")
+            self.assertEqual(reader.next_tokens(2), ["-2", "3"])
+            self.assertEqual(reader.next_tokens(), ["4"])
+            self.assertEqual(read_next_token(reader), "")
+
+    def test_invalid_token(self):
+        for reader in (TokenReader(io.StringIO("1 x 3")), TokenReader.from_path(self.write_input("1 x 3"))):
+            with self.assertRaises(ValueError):
+                reader.next_tokens()
+
+
+class ReadListTest(unittest.TestCase):
+    def test_readlist(self):
+        expected = translate("x = list(1, -2, 3)\nnull = print(x)", io.StringIO())
+        self.assertEqual(translate("x = readlist(3)\nnull = print(x)", io.StringIO("1 -2 3 4")), expected)
+        self.assertEqual(translate("x = readlist()\nnull = print(x)", io.StringIO("1 -2 3")), expected)
+
+    def test_readlist_errors(self):
+        for source, stdin, message in [
+            ("x = readlist(3)\nnull = print(x)", "1 2", "readlist expects 3 input-numeric literals, got 2"),
+            ("x = readlist()\nnull = print(x)", "1 a", "Invalid input-numeric literal: a"),
+        ]:
+            with self.assertRaises(TranslationError) as context:
+                translate(source, io.StringIO(stdin))
+            self.assertEqual(str(context.exception), message)
+            self.assertEqual(context.exception.line_number, 1)
+
+    def test_input_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source_path = os.path.join(directory, "program.vta")
+            with open(source_path, "w") as source_file:
+                source_file.write("n = read()\nx = readlist()\nnull = print(add(n, sum(x)))")
+            input_path = os.path.join(directory, "input.txt")
+            with open(input_path, "w") as input_file:
+                input_file.write(SPLIT_TOKEN_INPUT)
+            process = subprocess.run(
+                [sys.executable, "translate.py", source_path, "--input", input_path, "--evaluate"],
+                stdout=subprocess.PIPE, universal_newlines=True, check=True,
+            )
+        self.assertEqual(process.stdout, "{}\n".format(7 * (CHUNK_SIZE // 2 - 1) + 123456 + 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import dataclasses
+import io
+import os
+import subprocess
+import tempfile
+import unittest
+
+from translate import DEFAULT_OPTIONS, TranslationError, translate
+
+MODULES = {
+    "lib/lists.vta": "total = num(lst: type) -> if(eq(size(lst), 0), 0, add(head(lst), total(tail(lst))))\n"
+                     "base = list(1, 2, 3)\n",
+    "mathx.vta": "import lib/lists\nsq = num(x: num) -> mul(x, x)\nk = total(base)\n",
+    "reader.vta": "x = 1\ny = add(x, read())\n",
+    "listreader.vta": "x = 1\ny = readlist(2)\n",
+}
+
+
+class ModulesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.old_cache_dir = os.environ.get("VTA_CACHE_DIR")
+        os.environ["VTA_CACHE_DIR"] = os.path.join(self.directory.name, "cache")
+        self.addCleanup(self.restore_cache_dir)
+        for name, source in MODULES.items():
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as module_file:
+                module_file.write(source)
+        self.options = dataclasses.replace(DEFAULT_OPTIONS, import_path=(self.directory.name,))
+
+    def restore_cache_dir(self):
+        if self.old_cache_dir is None:
+            del os.environ["VTA_CACHE_DIR"]
+        else:
+            os.environ["VTA_CACHE_DIR"] = self.old_cache_dir
+
+    def run_program(self, source, options=None):
+        cpp_path = os.path.join(self.directory.name, "out.cpp")
+        with open(cpp_path, "w") as cpp_file:
+            cpp_file.write(translate(source, io.StringIO(), options or self.options))
+        binary_path = os.path.join(self.directory.name, "out")
+        subprocess.run(["g++", "--std=c++17", cpp_path, "-o", binary_path], check=True)
+        return subprocess.run([binary_path], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+
+    def test_transitive_import(self):
+        output = self.run_program("import mathx\nnull = print(sq(k))\nnull = print(total(base))")
+        self.assertEqual(output, "36\n6\n")
+
+    def test_reassign_imported_variable(self):
+        output = self.run_program(
+            "import mathx\nk = add(k, 1)\nnull = print(sq(k))\nbase = cons(4, base)\nnull = print(total(base))"
+        )
+        self.assertEqual(output, "49\n10\n")
+
+    def test_modules_can_not_read(self):
+        for name in ("reader", "listreader"):
+            with self.assertRaises(TranslationError) as context:
+                translate("\nimport {}\nnull = print(x)".format(name), io.StringIO("1 2 3"), self.options)
+            self.assertIn("{}.vta:2: Modules can not read()".format(name), str(context.exception))
+            self.assertEqual(context.exception.line_number, 2)
+
+    def test_precompile_imports(self):
+        options = dataclasses.replace(self.options, precompile_imports=True)
+        cpp_code = translate("import mathx\nnull = print(k)", io.StringIO(), options)
+        header = cpp_code.split('#include "', 1)[1].split('"', 1)[0]
+        self.assertTrue(os.path.exists(header + ".gch"))
+        self.assertEqual(self.run_program("import mathx\nnull = print(k)", options), "6\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+import unittest
+
+
+def serve(requests):
+    process = subprocess.run(
+        [sys.executable, "server.py"], input=''.join(json.dumps(request) + "\n" for request in requests),
+        stdout=subprocess.PIPE, universal_newlines=True, timeout=60,
+    )
+    return process.returncode, [json.loads(line) for line in process.stdout.splitlines()]
+
+
+class ServerTest(unittest.TestCase):
+    def test_survives_pathological_request(self):
+        deep = "add(1, " * 3000 + "1" + ")" * 3000
+        returncode, responses = serve([
+            {"id": 1, "source": "a = {}\nnull = print(a)".format(deep)},
+            {"id": 2, "source": "a = 1\nnull = print(a)"},
+        ])
+        self.assertEqual(returncode, 0)
+        self.assertEqual([response["id"] for response in responses], [1, 2])
+        self.assertIn("error", responses[0])
+        self.assertIn("cpp", responses[1])
+
+    def test_rejects_imports_outside_server_directory(self):
+        _, responses = serve([
+            {"id": 1, "source": "import /etc/lib\nnull = print(1)"},
+            {"id": 2, "source": "a = 1\nimport lib/../../lib\nnull = print(a)"},
+        ])
+        self.assertEqual([response["error"]["type"] for response in responses], ["RequestError", "RequestError"])
+        self.assertEqual([response["error"]["line"] for response in responses], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
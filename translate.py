@@ -1,12 +1,25 @@
+import argparse
+import copy
+import dataclasses
+import glob
+import io
+import itertools
+import os
 import re
-from collections import namedtuple
+import subprocess
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from enum import Enum
 import sys
-from utils import read_next_token
+import weakref
+from utils import TokenReader, get_token_reader, read_next_token
+from vta_stats import TranslationStats, collect_stats, count_event, timed_phase
 
 VARIABLE_TEMPLATE = re.compile(r"[a-zA-Z][a-zA-Z0-9]*")
 NUMERIC_LITERAL_TEMPLATE = re.compile(r"^-?\d+$")
+TOKEN_TEMPLATE = re.compile(r"[a-zA-Z][a-zA-Z0-9]*|\d+|\S")
+IMPORT_TEMPLATE = re.compile(r"^\s*import\s+([^\s=#]+)\s*$")
 
 
 class VariableTypeEnum(Enum):
@@ -28,6 +41,12 @@ class VariableType:
         self.return_type = return_type
         self.args = args
 
+    def __eq__(self, other):
+        return isinstance(other, VariableType) and (self.return_type, self.args) == (other.return_type, other.args)
+
+    def __hash__(self):
+        return hash((self.return_type, tuple(self.args.items())))
+
     def __str__(self):
         return "VariableType(return_type={}, args={})".format(self.return_type, self.args)
 
@@ -57,6 +76,7 @@ BUILT_IN_IDENTIFIERS = {
     'div': VariableType.NUMERIC,
     'mod': VariableType.NUMERIC,
     'read': VariableType.NUMERIC,
+    'readlist': VariableType.TYPE,
     'print': VariableType.NULL,
     'list': VariableType.TYPE,
     'head': VariableType.NUMERIC,
@@ -89,15 +109,113 @@ BUILT_IN_IDENTIFIERS = {
     'get': VariableType.NUMERIC,
     'map': VariableType.TYPE,
     'pow': VariableType.NUMERIC,
+    'range': VariableType.TYPE,
+    'fold': VariableType.NUMERIC,
+    'filter': VariableType.TYPE,
+    'sum': VariableType.NUMERIC,
+    'sort': VariableType.TYPE,
+    'reverse': VariableType.TYPE,
+    'zip': VariableType.TYPE,
+}
+
+
+NUMERIC_ARGS = (VariableType.NUMERIC,)
+TYPE_ARGS = (VariableType.TYPE,)
+BINARY_NUMERIC_ARGS = (VariableType.NUMERIC, VariableType.NUMERIC)
+BINARY_TYPE_ARGS = (VariableType.TYPE, VariableType.TYPE)
+LIST_FUNCTION = VariableType(VariableType.NUMERIC, {'x': VariableType.NUMERIC})
+FOLD_FUNCTION = VariableType(VariableType.NUMERIC, {'acc': VariableType.NUMERIC, 'x': VariableType.NUMERIC})
+
+BUILT_IN_SIGNATURES = {
+    'add': BINARY_NUMERIC_ARGS,
+    'sub': BINARY_NUMERIC_ARGS,
+    'mul': BINARY_NUMERIC_ARGS,
+    'div': BINARY_NUMERIC_ARGS,
+    'mod': BINARY_NUMERIC_ARGS,
+    'head': TYPE_ARGS,
+    'tail': TYPE_ARGS,
+    'size': TYPE_ARGS,
+    'cons': (VariableType.NUMERIC, VariableType.TYPE),
+    'append': (VariableType.TYPE, VariableType.NUMERIC),
+    'concat': BINARY_TYPE_ARGS,
+    'lieq': BINARY_TYPE_ARGS,
+    'eq': BINARY_NUMERIC_ARGS,
+    'neq': BINARY_NUMERIC_ARGS,
+    'not': NUMERIC_ARGS,
+    'bnot': NUMERIC_ARGS,
+    'and': BINARY_NUMERIC_ARGS,
+    'band': BINARY_NUMERIC_ARGS,
+    'or': BINARY_NUMERIC_ARGS,
+    'bor': BINARY_NUMERIC_ARGS,
+    'xor': BINARY_NUMERIC_ARGS,
+    'bool': NUMERIC_ARGS,
+    'lshift': BINARY_NUMERIC_ARGS,
+    'rshift': BINARY_NUMERIC_ARGS,
+    'lt': BINARY_NUMERIC_ARGS,
+    'leq': BINARY_NUMERIC_ARGS,
+    'gt': BINARY_NUMERIC_ARGS,
+    'geq': BINARY_NUMERIC_ARGS,
+    'if': (VariableType.NUMERIC, VariableType.NUMERIC, VariableType.NUMERIC),
+    'tif': (VariableType.NUMERIC, VariableType.TYPE, VariableType.TYPE),
+    'count': (VariableType.TYPE, VariableType.NUMERIC),
+    'contains': (VariableType.TYPE, VariableType.NUMERIC),
+    'get': (VariableType.TYPE, VariableType.NUMERIC),
+    'map': (VariableType.TYPE, LIST_FUNCTION),
+    'pow': BINARY_NUMERIC_ARGS,
+    'range': BINARY_NUMERIC_ARGS,
+    'fold': (VariableType.TYPE, FOLD_FUNCTION, VariableType.NUMERIC),
+    'filter': (VariableType.TYPE, LIST_FUNCTION),
+    'sum': TYPE_ARGS,
+    'sort': TYPE_ARGS,
+    'reverse': TYPE_ARGS,
+    'zip': BINARY_TYPE_ARGS,
+}
+
+VARIADIC_BUILT_INS = {'nan', 'list'}
+
+LAZY_BRANCH_IDENTIFIERS = {'if', 'tif'}
+
+CONSTEXPR_IDENTIFIERS = {
+    'nan', 'add', 'sub', 'mul', 'div', 'mod', 'eq', 'neq', 'not', 'bnot', 'and', 'band',
+    'or', 'bor', 'xor', 'bool', 'lshift', 'rshift', 'lt', 'leq', 'gt', 'geq', 'pow',
 }
 
 
+class ArithmeticBackend(Enum):
+    STRUCT = "struct"
+    CONSTEXPR = "constexpr"
+
+
+class ListBackend(Enum):
+    PACK = "pack"
+    ARRAY = "array"
+
+
+@dataclass(frozen=True)
+class TranslationOptions:
+    arithmetic: ArithmeticBackend = ArithmeticBackend.STRUCT
+    lists: ListBackend = ListBackend.PACK
+    stdlib_include: str = None
+    line_tags: bool = False
+    eliminate_dead_code: bool = True
+    fold_constants: bool = True
+    lower_recursion: bool = True
+    check_types: bool = True
+    import_path: tuple = ()
+    precompile_imports: bool = False
+    imports: object = None
+    module: str = None
+
+
+DEFAULT_OPTIONS = TranslationOptions()
+
+
 class ParsingError(Exception):
-    pass
+    line_number = None
 
 
 class TranslationError(Exception):
-    pass
+    line_number = None
 
 
 @dataclass
@@ -140,16 +258,15 @@ class Assignment:
         return "Assignment({}, {})".format(self.left_op, self.right_op)
 
 
-@dataclass
+@dataclass(frozen=True)
 class NumericLiteral:
+    __slots__ = ("value",)
     value: int
 
-    def __init__(self, value):
-        self.value = value
-
 
-@dataclass
+@dataclass(frozen=True)
 class VariableValue:
+    __slots__ = ("name",)
     name: str
 
 
@@ -160,10 +277,11 @@ class RvalueType(Enum):
     LOCAL_VARIABLE = 3
 
 
-@dataclass
+@dataclass(frozen=True)
 class Call:
+    __slots__ = ("identifier", "arguments")
     identifier: str
-    arguments: list
+    arguments: tuple
 
 
 class FuncLitType(Enum):
@@ -177,53 +295,52 @@ FUNC_LIT_TYPES_STR = {
 }
 
 
-def parse_signature(tokens):
-    call_args = get_call_args(tokens)
-    args = {}
-    for call_arg in call_args:
-        args[call_arg[0]] = get_func_lit_type(call_arg)
-    return args
+def parse_signature(stream):
+    return dict(parse_call_args(stream, parse_signature_arg, "Bad function literal syntax. ')' expected somewhere"))
 
 
-def get_func_lit_type(args):
-    if len(args) == 3:
-        arg = args[2]
-        if arg not in FUNC_LIT_TYPES_STR:
-            raise ParsingError("Unknown function literal type: '{}'".format(arg))
-        return FUNC_LIT_TYPES_STR[arg]
-    else:
-        return VariableType(FUNC_LIT_TYPES_STR[args[2]], parse_signature(args[2:]))
+def parse_signature_arg(stream):
+    name = stream.next()
+    stream.expect(':', "Bad function literal syntax. ':' expected after argument name")
+    return name, get_func_lit_type(stream)
+
+
+def get_func_lit_type(stream):
+    arg = stream.next()
+    if arg not in FUNC_LIT_TYPES_STR:
+        raise ParsingError("Unknown function literal type: '{}'".format(arg))
+    if stream.peek() == '(':
+        return VariableType(FUNC_LIT_TYPES_STR[arg], parse_signature(stream))
+    return FUNC_LIT_TYPES_STR[arg]
 
 
 class FunctionalLiteral:
     def __init__(self, name, raw_expr, functional_literals, variables, stdin):
         self.name = name
         self.raw_expr = raw_expr
-        tokens = get_tokens(raw_expr)
-        self.func_lit_type = get_func_lit_type(["", "", tokens[0]])
-        if tokens[1] != "(":
+        stream = TokenStream(lex(raw_expr))
+        literal_type = stream.next()
+        if literal_type not in FUNC_LIT_TYPES_STR:
+            raise ParsingError("Unknown function literal type: '{}'".format(literal_type))
+        self.func_lit_type = FUNC_LIT_TYPES_STR[literal_type]
+        if stream.peek() != "(":
             raise ParsingError("Bad function literal syntax. '(' expected after literal type")
-        if ")" not in tokens:
-            raise ParsingError("Bad function literal syntax. ')' expected somewhere")
-
-        signature_end = tokens.index('-')
-        call_args = get_call_args(tokens[:signature_end])
 
-        args = {}
-        for call_arg in call_args:
-            args[call_arg[0]] = get_func_lit_type(call_arg)
-
-        self.args = args
-        rvalue_start_index = tokens.index('>')
-        rvalue_tokens = tokens[rvalue_start_index + 1:]
-        self.rvalue = Rvalue(variables, ''.join(rvalue_tokens), functional_literals, args, stdin)
+        self.args = parse_signature(stream)
+        stream.expect('-', "Bad function literal syntax. '->' expected after signature")
+        stream.expect('>', "Bad function literal syntax. '->' expected after signature")
+        start = stream.index
+        self.rvalue = parse_rvalue(variables, None, functional_literals, self.args, stdin, stream)
+        ensure_consumed(stream, self.rvalue, start)
+        self.recursion = None
 
     def __str__(self):
         return "FunctionalLiteral(name={}, args={}, rvalue={})".format(self.name, self.args, self.rvalue)
 
 
-@dataclass
+@dataclass(frozen=True)
 class LocalVariable:
+    __slots__ = ("name", "type")
     name: str
     type: VariableType
 
@@ -242,95 +359,149 @@ class LocalVariableType(Enum):
             raise ParsingError("Can not resolve type '{}' into local variable type".format(var_type))
 
 
-def get_call_args(tokens):
-    if tokens[1] != "(":
-        raise ParsingError("Call must have '(' after the call name")
-    if tokens[-1] != ")":
-        raise ParsingError("Call must have ')' at the end")
-    if tokens[1:] == ['(', ')']:
-        return []
-    last_index = 2
-    deep = 0
-    args = []
-    for i in range(len(tokens)):
-        token = tokens[i]
-        if token == '(':
-            deep += 1
-        elif token == ')':
-            deep -= 1
-        elif token == ',' and deep == 1:
-            args.append(tokens[last_index:i])
-            last_index = i + 1
-    args.append(tokens[last_index:-1])
-    return args
-
-
-def parse_call(variables, tokens, functional_literals, local_vars, stdin):
+def parse_call_args(stream, parse_arg, unclosed_message="Call must have ')' at the end"):
+    stream.expect('(', "Call must have '(' after the call name")
     args = []
-    for call_arg in get_call_args(tokens):
-        rvalue = Rvalue(variables, ''.join(call_arg), functional_literals, local_vars, stdin)
-        args.append(rvalue)
-    return Call(tokens[0], args)
+    if stream.peek() == ')':
+        stream.next()
+        return args
+    while True:
+        args.append(parse_arg(stream))
+        token = stream.next()
+        if token == ')':
+            return args
+        if token != ',':
+            raise ParsingError(unclosed_message)
+
+
+def parse_call(variables, stream, functional_literals, local_vars, stdin):
+    identifier = stream.next()
+    args = parse_call_args(
+        stream,
+        lambda arg_stream: parse_rvalue(variables, None, functional_literals, local_vars, stdin, arg_stream)
+    )
+    return Call(identifier, tuple(args))
+
+
+def ensure_consumed(stream, rvalue, start):
+    if stream.at_end():
+        return
+    if rvalue.type == RvalueType.CALL:
+        raise ParsingError("Call must have ')' at the end")
+    raise ParsingError("Unknown rvalue type: '{}'".format(stream.text(start, len(stream.tokens))))
+
+
+def read_input_list(arguments, stdin):
+    if len(arguments) > 1 or (arguments and arguments[0].type != RvalueType.NUMERIC_LITERAL):
+        raise TranslationError("readlist expects at most one numeric literal argument")
+    count = int(arguments[0].value.value) if arguments else None
+    try:
+        numeric_literals = get_token_reader(stdin).next_tokens(count)
+    except ValueError as e:
+        raise TranslationError("Invalid input-numeric literal: {}".format(e))
+    if count is not None and len(numeric_literals) < count:
+        raise TranslationError("readlist expects {} input-numeric literals, got {}".format(
+            count, len(numeric_literals)
+        ))
+    return numeric_literals
 
 
 class Rvalue:
-    def __init__(self, variables, raw_rvalue, func_lit_types, local_vars, stdin):
-        self.local_vars = local_vars
-        self.raw_rvalue = raw_rvalue
-        if local_vars is not None:
-            if raw_rvalue in local_vars:
-                self.value = LocalVariable(raw_rvalue, local_vars[raw_rvalue])
-                self.type = RvalueType.LOCAL_VARIABLE
-                self.variable_type = local_vars[raw_rvalue]
-                return
-        if NUMERIC_LITERAL_TEMPLATE.match(raw_rvalue):
-            self.value = NumericLiteral(int(raw_rvalue))
-            self.type = RvalueType.NUMERIC_LITERAL
-            self.variable_type = VariableType.NUMERIC
-        elif raw_rvalue in variables:
-            self.value = VariableValue(variables[raw_rvalue].name)
-            self.type = RvalueType.VARIABLE_VALUE
-            self.variable_type = variables[raw_rvalue].type
-        else:
-            tokens = get_tokens(raw_rvalue)
-            if len(tokens) < 2:
-                raise ParsingError("Unknown rvalue type: '{}'".format(raw_rvalue))
-            if tokens[0] in local_vars:
-                parsed_call = parse_call(variables, tokens, func_lit_types, local_vars, stdin)
-                self.type = RvalueType.CALL
-                self.variable_type = local_vars[tokens[0]]
-                self.value = parsed_call
-
-            elif tokens[0] in func_lit_types and tokens[1] == "(":
-                parsed_call = parse_call(variables, tokens, func_lit_types, local_vars, stdin)
-                self.type = RvalueType.CALL
-                self.value = parsed_call
-                self.variable_type = func_lit_types[tokens[0]]
-            elif tokens[0] in BUILT_IN_IDENTIFIERS and tokens[1] == "(":
-                parsed_call = parse_call(variables, tokens, func_lit_types, local_vars, stdin)
-                if parsed_call.identifier == 'read':
-                    self.type = RvalueType.NUMERIC_LITERAL
-                    numeric_literal = read_next_token(stdin)
-                    if not NUMERIC_LITERAL_TEMPLATE.match(numeric_literal):
-                        raise TranslationError("Invalid input-numeric literal: {}".format(numeric_literal))
-                    self.value = NumericLiteral(numeric_literal)
-                    self.variable_type = BUILT_IN_IDENTIFIERS[tokens[0]]
-                else:
-                    self.type = RvalueType.CALL
-                    self.value = parsed_call
-                    self.variable_type = BUILT_IN_IDENTIFIERS[tokens[0]]
-            else:
-                raise ParsingError("Unknown rvalue type: '{}'".format(raw_rvalue))
+    __slots__ = ("type", "value", "variable_type", "local_type", "has_branch", "cpp", "__weakref__")
+
+    def __init__(self, type, value, variable_type, local_type):
+        self.type = type
+        self.value = value
+        self.variable_type = variable_type
+        self.local_type = local_type
+        self.has_branch = type == RvalueType.CALL and (
+            value.identifier in LAZY_BRANCH_IDENTIFIERS or any(arg.has_branch for arg in value.arguments)
+        )
+        self.cpp = None
+
+    @staticmethod
+    def make(type, value, variable_type, local_type=None):
+        count_event("rvalues")
+        key = (type, value, variable_type, local_type)
+        rvalue = RVALUE_NODES.get(key)
+        if rvalue is None:
+            count_event("rvalue_nodes")
+            rvalue = Rvalue(type, value, variable_type, local_type)
+            RVALUE_NODES[key] = rvalue
+        return rvalue
+
+    @staticmethod
+    def numeric_literal(value):
+        return Rvalue.make(RvalueType.NUMERIC_LITERAL, NumericLiteral(int(value)), VariableType.NUMERIC)
 
     def __repr__(self):
-        return "Rvalue(type={}, value={}, variable_type={}, local_vars={})".format(
-            self.type, self.value, self.variable_type, self.local_vars
+        return "Rvalue(type={}, value={}, variable_type={}, local_type={})".format(
+            self.type, self.value, self.variable_type, self.local_type
         )
 
 
+RVALUE_NODES = weakref.WeakValueDictionary()
+
+
+def parse_rvalue(variables, raw_rvalue, func_lit_types, local_vars, stdin, stream=None):
+    own_stream = stream is None
+    if own_stream:
+        stream = TokenStream(lex(raw_rvalue))
+    start = stream.index
+    rvalue = parse_rvalue_tokens(variables, stream, func_lit_types, local_vars, stdin)
+    if own_stream:
+        ensure_consumed(stream, rvalue, start)
+    return rvalue
+
+
+def parse_rvalue_tokens(variables, stream, func_lit_types, local_vars, stdin):
+    start = stream.index
+    token = stream.next()
+    is_call = stream.peek() == '('
+    local_type = local_vars.get(token) if local_vars is not None else None
+
+    def raise_unknown():
+        raise ParsingError("Unknown rvalue type: '{}'".format(stream.text(start, stream.rvalue_end(start))))
+
+    def parse_token_call():
+        stream.index = start
+        return parse_call(variables, stream, func_lit_types, local_vars, stdin)
+
+    if local_type is not None and not is_call:
+        return Rvalue.make(RvalueType.LOCAL_VARIABLE, LocalVariable(token, local_type), local_type)
+    elif token == '-' or (token is not None and token.isdigit()):
+        if token == '-' and stream.peek() is not None and stream.peek().isdigit():
+            token += stream.next()
+        if not NUMERIC_LITERAL_TEMPLATE.match(token):
+            raise_unknown()
+        return Rvalue.numeric_literal(token)
+    elif token in variables and not is_call:
+        return Rvalue.make(RvalueType.VARIABLE_VALUE, VariableValue(variables[token].name), variables[token].type)
+    elif not is_call:
+        raise_unknown()
+    elif local_type is not None:
+        return Rvalue.make(RvalueType.CALL, parse_token_call(), local_type, local_type)
+    elif token in func_lit_types:
+        return Rvalue.make(RvalueType.CALL, parse_token_call(), func_lit_types[token])
+    elif token in BUILT_IN_IDENTIFIERS:
+        parsed_call = parse_token_call()
+        if parsed_call.identifier == 'read':
+            numeric_literal = read_next_token(stdin)
+            if not NUMERIC_LITERAL_TEMPLATE.match(numeric_literal):
+                raise TranslationError("Invalid input-numeric literal: {}".format(numeric_literal))
+            return Rvalue.numeric_literal(numeric_literal)
+        elif parsed_call.identifier == 'readlist':
+            parsed_call = Call('list', tuple(
+                Rvalue.numeric_literal(numeric_literal)
+                for numeric_literal in read_input_list(parsed_call.arguments, stdin)
+            ))
+        return Rvalue.make(RvalueType.CALL, parsed_call, BUILT_IN_IDENTIFIERS[token])
+    raise_unknown()
+
+
 def get_variables(assignments):
     variables = {}
-    for left_op, right_op in assignments:
+    for left_op, right_op, _ in assignments:
         if '(' not in left_op and ')' not in left_op:
             if '->' in right_op:
                 variables[left_op] = LocalVariableType.FUNCTION
@@ -339,45 +510,83 @@ def get_variables(assignments):
     return variables
 
 
+RawCodeLine = namedtuple("RawCodeLine", ["left_op", "right_op", "line_number"])
+
+
+def get_code_line(line, i):
+    if not line.strip() or line.strip().startswith('#'):
+        return None
+    eql_cnt = line.count('=')
+    if eql_cnt != 1:
+        error = ParsingError(
+            "Every line must contain exactly one assignment, non-empty line {}\n({})".format(i, line)
+        )
+        error.line_number = i + 1
+        raise error
+    left_op, right_op = line.split('=')
+    return RawCodeLine(left_op.strip(), right_op.strip(), i + 1)
+
+
 def get_code_lines(source):
     assignments = []
     splitted_source = source.split('\n')
     for i in range(len(splitted_source)):
-        line = splitted_source[i]
-        if not line.strip() or line.strip().startswith('#'):
-            continue
-        eql_cnt = line.count('=')
-        if eql_cnt != 1:
-            raise ParsingError(
-                "Every line must contain exactly one assignment, non-empty line {}\n({})".format(i, line)
-            )
-        left_op, right_op = line.split('=')
-        left_op = left_op.strip()
-        right_op = right_op.strip()
-        assignments.append((left_op, right_op))
+        code_line = get_code_line(splitted_source[i], i)
+        if code_line is not None:
+            assignments.append(code_line)
     return assignments
 
 
-def is_same_type(c1: str, c2: str):
-    if c1.isspace() and c2.isspace():
-        return True
-    elif c1.isalpha() and c2.isalpha():
-        return True
-    elif c1.isnumeric() and c2.isnumeric():
-        return True
-    return False
+Token = namedtuple("Token", ["value", "position"])
 
 
-def get_tokens(source):
-    source = source.replace(' ', '')
-    result = []
-    last_index = 0
-    for i in range(len(source) - 1):
-        if not is_same_type(source[i], source[i + 1]):
-            result.append(source[last_index:i + 1])
-            last_index = i + 1
-    result.append(source[last_index:])
-    return result
+def lex(source):
+    tokens = [Token(match.group(), match.start()) for match in TOKEN_TEMPLATE.finditer(source)]
+    count_event("tokens", len(tokens))
+    return tokens
+
+
+class TokenStream:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self, offset=0):
+        index = self.index + offset
+        if index < len(self.tokens):
+            return self.tokens[index].value
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is not None:
+            self.index += 1
+        return token
+
+    def expect(self, token, message):
+        if self.peek() != token:
+            raise ParsingError(message)
+        self.index += 1
+
+    def at_end(self):
+        return self.index >= len(self.tokens)
+
+    def text(self, start, end):
+        return ''.join(token.value for token in self.tokens[start:end])
+
+    def rvalue_end(self, start):
+        deep = 0
+        for i in range(start, len(self.tokens)):
+            token = self.tokens[i].value
+            if token == '(':
+                deep += 1
+            elif token == ')':
+                if deep == 0:
+                    return i
+                deep -= 1
+            elif token == ',' and deep == 0:
+                return i
+        return len(self.tokens)
 
 
 def preparse_func_literals(raw_pairs):
@@ -419,22 +628,23 @@ class FunctionalLiteralSpecialization:
         self.raw_left = raw_left
         self.raw_right = raw_right
         self.local_vars = {}
-        tokens = get_tokens(raw_left)
-        parameters = []
-        for call_arg in get_call_args(tokens):
-            call_arg = ''.join(call_arg)
-            if call_arg in related_func_lit.args:
-                variable_type = related_func_lit.args[call_arg]
-                free_variable = FreeVariable(call_arg, variable_type)
-                parameters.append(FuncLitSpecArg(free_variable, FuncLitSpecArgType.FREE_VARIABLE))
-                self.local_vars[call_arg] = variable_type
-            else:
-                rvalue = Rvalue(variables, call_arg, func_lit_types, self.local_vars, stdin)
-                parameters.append(FuncLitSpecArg(rvalue, FuncLitSpecArgType.RVALUE))
 
-        self.parameters = parameters
-        self.rvalue = Rvalue(variables, raw_right, func_lit_types, self.local_vars, stdin)
-        self.name = get_func_lit_spec_name(raw_left)
+        def parse_parameter(stream):
+            token = stream.peek()
+            if token in related_func_lit.args and stream.peek(1) in (',', ')'):
+                stream.next()
+                variable_type = related_func_lit.args[token]
+                self.local_vars[token] = variable_type
+                return FuncLitSpecArg(FreeVariable(token, variable_type), FuncLitSpecArgType.FREE_VARIABLE)
+            rvalue = parse_rvalue(variables, None, func_lit_types, self.local_vars, stdin, stream)
+            return FuncLitSpecArg(rvalue, FuncLitSpecArgType.RVALUE)
+
+        stream = TokenStream(lex(raw_left))
+        self.name = stream.next()
+        self.parameters = parse_call_args(stream, parse_parameter)
+        if not stream.at_end():
+            raise ParsingError("Call must have ')' at the end")
+        self.rvalue = parse_rvalue(variables, raw_right, func_lit_types, self.local_vars, stdin)
 
     def __str__(self):
         return "FunctionalLiteralSpecialization(name={}, rvalue={}, " \
@@ -454,136 +664,758 @@ class LineType(Enum):
     FUNC_LIT_SPECIALIZATION = 2
 
 
-CodeLine = namedtuple("CodeLine", ["line_type", "object"])
+CodeLine = namedtuple("CodeLine", ["line_type", "object", "line_number"], defaults=[None])
 
 
 def get_func_lit_spec_name(raw_value):
-    return get_tokens(raw_value)[0]
+    return lex(raw_value)[0].value
+
+
+def get_line_type(raw_code_line):
+    if '->' in raw_code_line.right_op:
+        return LineType.FUNC_LIT
+    elif '(' in raw_code_line.left_op and ')' in raw_code_line.left_op:
+        return LineType.FUNC_LIT_SPECIALIZATION
+    return LineType.ASSIGNMENT
+
+
+def parse_code_line(variables, func_lit_types, functional_literals, raw_code_line, stdin, index):
+    line_number = raw_code_line.line_number
+    try:
+        line_type = get_line_type(raw_code_line)
+        if line_type == LineType.FUNC_LIT:
+            func_lit = FunctionalLiteral(
+                raw_code_line.left_op, raw_code_line.right_op, func_lit_types, variables, stdin
+            )
+            functional_literals[func_lit.name] = func_lit
+            return CodeLine(LineType.FUNC_LIT, func_lit, line_number)
+        elif line_type == LineType.FUNC_LIT_SPECIALIZATION:
+            func_lit_spec_name = get_func_lit_spec_name(raw_code_line.left_op)
+            if func_lit_spec_name not in functional_literals:
+                raise ParsingError("No such functional literal with name '{}'".format(func_lit_spec_name))
+            functional_literal = functional_literals[func_lit_spec_name]
+            func_lit_spec = FunctionalLiteralSpecialization(
+                variables, func_lit_types, functional_literal, raw_code_line.left_op, raw_code_line.right_op,
+                stdin
+            )
+            return CodeLine(LineType.FUNC_LIT_SPECIALIZATION, func_lit_spec, line_number)
+        else:
+            rvalue = parse_rvalue(variables, raw_code_line.right_op, func_lit_types, {}, stdin)
+            if raw_code_line.left_op not in variables:
+                raise ParsingError("Can not find variable '{}'".format(raw_code_line.left_op))
+            variables[raw_code_line.left_op].inc()
+            lvalue_full_name = variables[raw_code_line.left_op].name
+            variables[raw_code_line.left_op].type = rvalue.variable_type
+            return CodeLine(LineType.ASSIGNMENT, Assignment(lvalue_full_name, rvalue), line_number)
+    except ParsingError as e:
+        error = ParsingError(str(e) + " non-empty line: {}\n({})".format(
+            index, ' = '.join(raw_code_line[:2])
+        ))
+        error.line_number = line_number
+        raise error
+    except TranslationError as e:
+        e.line_number = line_number
+        raise
 
 
 def parse_vta_code(variables, func_lit_types, raw_code_lines, stdin):
+    stdin = get_token_reader(stdin)
     code_lines = []
     functional_literals = {}
     for i in range(len(raw_code_lines)):
-        raw_code_line = raw_code_lines[i]
-        try:
-            if '->' in raw_code_line[1]:
-                func_lit = FunctionalLiteral(*raw_code_line, func_lit_types, variables, stdin)
-                functional_literals[func_lit.name] = func_lit
-                code_lines.append(CodeLine(LineType.FUNC_LIT, func_lit))
-            elif '(' in raw_code_line[0] and ')' in raw_code_line[0]:
-                func_lit_spec_name = get_func_lit_spec_name(raw_code_line[0])
-                if func_lit_spec_name not in functional_literals:
-                    raise ParsingError("No such functional literal with name '{}'".format(func_lit_spec_name))
-                functional_literal = functional_literals[func_lit_spec_name]
-                func_lit_spec = FunctionalLiteralSpecialization(
-                    variables, func_lit_types, functional_literal, *raw_code_line, stdin
-                )
-                code_lines.append(CodeLine(LineType.FUNC_LIT_SPECIALIZATION, func_lit_spec))
-            else:
-                rvalue = Rvalue(variables, raw_code_line[1], func_lit_types, {}, stdin)
-                if raw_code_line[0] not in variables:
-                    raise ParsingError("Can not find variable '{}'".format(raw_code_line[0]))
-                variables[raw_code_line[0]].inc()
-                lvalue_full_name = variables[raw_code_line[0]].name
-                variables[raw_code_line[0]].type = rvalue.variable_type
-                code_lines.append(CodeLine(LineType.ASSIGNMENT, Assignment(lvalue_full_name, rvalue)))
-        except ParsingError as e:
-            raise ParsingError(str(e) + " non-empty line: {}\n({})".format(i, ' = '.join(raw_code_line)))
+        code_lines.append(parse_code_line(variables, func_lit_types, functional_literals, raw_code_lines[i], stdin, i))
     return code_lines
 
 
-def translate_left_op(assignment: Assignment):
+def format_type(var_type):
+    if isinstance(var_type, VariableType):
+        return "{}({})".format(format_type(var_type.return_type), ', '.join(
+            "{}: {}".format(name, format_type(arg_type)) for name, arg_type in var_type.args.items()
+        ))
+    if var_type == VariableType.VALUE_NOT_SET:
+        return "unassigned value"
+    return {VariableType.NUMERIC: "num", VariableType.TYPE: "type", VariableType.NULL: "null"}.get(var_type, "function")
+
+
+def format_rvalue(rvalue):
+    if rvalue.type == RvalueType.NUMERIC_LITERAL:
+        return str(rvalue.value.value)
+    elif rvalue.type == RvalueType.VARIABLE_VALUE:
+        return purify_name(rvalue.value.name)
+    elif rvalue.type == RvalueType.LOCAL_VARIABLE:
+        return rvalue.value.name
+    return "{}({})".format(rvalue.value.identifier, ', '.join(format_rvalue(arg) for arg in rvalue.value.arguments))
+
+
+def is_same_kind(actual, expected):
+    if isinstance(actual, VariableType) and isinstance(expected, VariableType):
+        return actual.return_type == expected.return_type and len(actual.args) == len(expected.args) and all(
+            is_same_kind(a, b) for a, b in zip(actual.args.values(), expected.args.values())
+        )
+    return actual == expected
+
+
+def get_checked_type(rvalue, signatures):
+    if rvalue.type == RvalueType.VARIABLE_VALUE and rvalue.variable_type == VariableType.FUNCTION_NOT_SET:
+        return signatures.get(purify_name(rvalue.value.name), VariableType.FUNCTION_NOT_SET)
+    return get_result_type(rvalue)
+
+
+def get_call_parameters(rvalue, signatures):
+    call = rvalue.value
+    if rvalue.local_type is not None:
+        if not isinstance(rvalue.local_type, VariableType):
+            return None, "'{}' is a {} argument, not a function".format(
+                call.identifier, format_type(rvalue.local_type)
+            )
+        return tuple(rvalue.local_type.args.values()), None
+    if call.identifier in signatures:
+        return tuple(signatures[call.identifier].args.values()), None
+    if call.identifier in VARIADIC_BUILT_INS:
+        return (VariableType.NUMERIC,) * len(call.arguments), None
+    return BUILT_IN_SIGNATURES.get(call.identifier), None
+
+
+def check_call(rvalue, signatures, messages):
+    call = rvalue.value
+    if call.identifier == 'print' and rvalue.local_type is None and call.identifier not in signatures:
+        if len(call.arguments) != 1:
+            messages.append("wrong number of arguments to 'print': expected 1, got {}".format(len(call.arguments)))
+        elif get_checked_type(call.arguments[0], signatures) not in (VariableType.NUMERIC, VariableType.TYPE):
+            messages.append("can not print {} '{}'".format(
+                format_type(get_checked_type(call.arguments[0], signatures)), format_rvalue(call.arguments[0])
+            ))
+        return
+    parameters, message = get_call_parameters(rvalue, signatures)
+    if message is not None:
+        messages.append(message)
+        return
+    if parameters is None:
+        return
+    if len(parameters) != len(call.arguments):
+        messages.append("wrong number of arguments to '{}': expected {}, got {} in '{}'".format(
+            call.identifier, len(parameters), len(call.arguments), format_rvalue(rvalue)
+        ))
+        return
+    for i, (arg, parameter) in enumerate(zip(call.arguments, parameters)):
+        arg_type = get_checked_type(arg, signatures)
+        if arg_type != VariableType.VALUE_NOT_SET and not is_same_kind(arg_type, parameter):
+            messages.append("argument {} of '{}' must be {}, got {} '{}'".format(
+                i + 1, call.identifier, format_type(parameter), format_type(arg_type), format_rvalue(arg)
+            ))
+
+
+def check_rvalue(rvalue, signatures, checked):
+    # Rvalues are hash-consed, so every shared subexpression is checked once per pass.
+    messages = checked.get(rvalue)
+    if messages is not None:
+        return messages
+    messages = []
+    if rvalue.type == RvalueType.VARIABLE_VALUE and rvalue.variable_type == VariableType.VALUE_NOT_SET:
+        messages.append("'{}' is used before it is assigned".format(format_rvalue(rvalue)))
+    elif rvalue.type == RvalueType.CALL:
+        for arg in rvalue.value.arguments:
+            messages.extend(check_rvalue(arg, signatures, checked))
+        check_call(rvalue, signatures, messages)
+    checked[rvalue] = messages
+    return messages
+
+
+def check_result(rvalue, expected, signatures, messages, what):
+    result_type = get_checked_type(rvalue, signatures)
+    if result_type != VariableType.VALUE_NOT_SET and not is_same_kind(result_type, expected):
+        messages.append("{} must be {}, got {} '{}'".format(
+            what, format_type(expected), format_type(result_type), format_rvalue(rvalue)
+        ))
+
+
+def check_code_line(code_line, signatures, checked):
+    line_type, atomic_obj, _ = code_line
+    messages = []
+    if line_type == LineType.ASSIGNMENT:
+        messages.extend(check_rvalue(atomic_obj.right_op, signatures, checked))
+        right_op = atomic_obj.right_op
+        if atomic_obj.left_op == 'null':
+            if right_op.type != RvalueType.CALL or right_op.value.identifier != 'print':
+                messages.append("only print(...) can be assigned to null, got '{}'".format(format_rvalue(right_op)))
+        else:
+            result_type = get_checked_type(right_op, signatures)
+            if result_type not in (VariableType.NUMERIC, VariableType.TYPE, VariableType.VALUE_NOT_SET):
+                messages.append("can not assign {} '{}' to '{}'".format(
+                    format_type(result_type), format_rvalue(right_op), purify_name(atomic_obj.left_op)
+                ))
+    elif line_type == LineType.FUNC_LIT:
+        messages.extend(check_rvalue(atomic_obj.rvalue, signatures, checked))
+        check_result(
+            atomic_obj.rvalue, atomic_obj.func_lit_type, signatures, messages, "body of '{}'".format(atomic_obj.name)
+        )
+    else:
+        parameters = tuple(atomic_obj.related_func_lit.args.values())
+        if len(parameters) != len(atomic_obj.parameters):
+            messages.append("wrong number of parameters in specialization of '{}': expected {}, got {}".format(
+                atomic_obj.name, len(parameters), len(atomic_obj.parameters)
+            ))
+        else:
+            for i, (parameter, expected) in enumerate(zip(atomic_obj.parameters, parameters)):
+                if parameter.type == FuncLitSpecArgType.FREE_VARIABLE:
+                    if not is_same_kind(parameter.value.variable_type, expected):
+                        messages.append("parameter {} of '{}' must be {}, got {} '{}'".format(
+                            i + 1, atomic_obj.name, format_type(expected),
+                            format_type(parameter.value.variable_type), parameter.value.name
+                        ))
+                else:
+                    messages.extend(check_rvalue(parameter.value, signatures, checked))
+                    check_result(
+                        parameter.value, expected, signatures, messages,
+                        "parameter {} of '{}'".format(i + 1, atomic_obj.name)
+                    )
+        messages.extend(check_rvalue(atomic_obj.rvalue, signatures, checked))
+        check_result(
+            atomic_obj.rvalue, atomic_obj.related_func_lit.func_lit_type, signatures, messages,
+            "body of '{}'".format(atomic_obj.raw_left)
+        )
+    return list(dict.fromkeys(messages))
+
+
+def get_func_lit_signatures(code_lines):
+    return {
+        atomic_obj.name: VariableType(atomic_obj.func_lit_type, atomic_obj.args)
+        for line_type, atomic_obj, _ in code_lines if line_type == LineType.FUNC_LIT
+    }
+
+
+def check_types(code_lines, imported_signatures=None):
+    signatures = dict(imported_signatures or {})
+    signatures.update(get_func_lit_signatures(code_lines))
+    checked = {}
+    diagnostics = []
+    line_numbers = []
+    for code_line in code_lines:
+        for message in check_code_line(code_line, signatures, checked):
+            diagnostics.append("line {}: {}".format(code_line.line_number, message))
+            line_numbers.append(code_line.line_number)
+    if diagnostics:
+        error = TranslationError('\n'.join(diagnostics))
+        error.line_number = line_numbers[0]
+        raise error
+    return code_lines
+
+
+LLONG_MIN = -2 ** 63
+LLONG_MAX = 2 ** 63 - 1
+
+
+def c_div(a, b):
+    if b == 0 or (a == LLONG_MIN and b == -1):
+        return None
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def c_mod(a, b):
+    quotient = c_div(a, b)
+    return None if quotient is None else a - b * quotient
+
+
+def c_lshift(a, b):
+    if a < 0 or not 0 <= b < 64 or a << b > 2 ** 64 - 1:
+        return None
+    return ((a << b) + 2 ** 63) % 2 ** 64 - 2 ** 63
+
+
+def c_pow(x, n):
+    if n < 0 or (abs(x) > 1 and n > 63):
+        return None
+    return x ** n
+
+
+FOLDING_FUNCS = {
+    'add': lambda a, b: a + b,
+    'sub': lambda a, b: a - b,
+    'mul': lambda a, b: a * b,
+    'div': c_div,
+    'mod': c_mod,
+    'eq': lambda a, b: int(a == b),
+    'neq': lambda a, b: int(a != b),
+    'not': lambda a: int(not a),
+    'bnot': lambda a: ~a,
+    'and': lambda a, b: int(bool(a and b)),
+    'band': lambda a, b: a & b,
+    'or': lambda a, b: int(bool(a or b)),
+    'bor': lambda a, b: a | b,
+    'xor': lambda a, b: a ^ b,
+    'bool': lambda a: int(bool(a)),
+    'lshift': c_lshift,
+    'rshift': lambda a, b: a >> b if 0 <= b < 64 else None,
+    'lt': lambda a, b: int(a < b),
+    'leq': lambda a, b: int(a <= b),
+    'gt': lambda a, b: int(a > b),
+    'geq': lambda a, b: int(a >= b),
+    'pow': c_pow,
+}
+
+
+def get_constant(rvalue):
+    if rvalue.type == RvalueType.NUMERIC_LITERAL:
+        return int(rvalue.value.value)
+    return None
+
+
+def fold_rvalue(rvalue, constants, functional_literals=()):
+    if rvalue.type == RvalueType.VARIABLE_VALUE:
+        value = constants.get(rvalue.value.name)
+        return rvalue if value is None else Rvalue.numeric_literal(value)
+    if rvalue.type != RvalueType.CALL:
+        return rvalue
+    call = rvalue.value
+    arguments = tuple(fold_rvalue(arg, constants, functional_literals) for arg in call.arguments)
+    if arguments != call.arguments:
+        call = Call(call.identifier, arguments)
+        rvalue = Rvalue.make(RvalueType.CALL, call, rvalue.variable_type, rvalue.local_type)
+    if rvalue.local_type is not None or call.identifier in functional_literals:
+        return rvalue
+    if call.identifier in LAZY_BRANCH_IDENTIFIERS and len(call.arguments) == 3:
+        condition = get_constant(call.arguments[0])
+        if condition is not None:
+            return call.arguments[1] if condition else call.arguments[2]
+        return rvalue
+    func = FOLDING_FUNCS.get(call.identifier)
+    if func is None or len(call.arguments) != func.__code__.co_argcount:
+        return rvalue
+    args = [get_constant(arg) for arg in call.arguments]
+    if None in args:
+        return rvalue
+    value = func(*args)
+    if value is None or not LLONG_MIN < value <= LLONG_MAX:
+        return rvalue
+    return Rvalue.numeric_literal(value)
+
+
+def fold_code_line(code_line, constants, functional_literals=()):
+    line_type, atomic_obj, _ = code_line
+    if line_type == LineType.ASSIGNMENT:
+        atomic_obj.right_op = fold_rvalue(atomic_obj.right_op, constants, functional_literals)
+        value = get_constant(atomic_obj.right_op)
+        if value is None:
+            constants.pop(atomic_obj.left_op, None)
+        elif atomic_obj.left_op != 'null':
+            constants[atomic_obj.left_op] = value
+    else:
+        atomic_obj.rvalue = fold_rvalue(atomic_obj.rvalue, constants, functional_literals)
+        if line_type == LineType.FUNC_LIT_SPECIALIZATION:
+            for parameter in atomic_obj.parameters:
+                if parameter.type == FuncLitSpecArgType.RVALUE:
+                    parameter.value = fold_rvalue(parameter.value, constants, functional_literals)
+    return code_line
+
+
+def fold_constants(code_lines, functional_literals=()):
+    constants = {}
+    for code_line in code_lines:
+        fold_code_line(code_line, constants, functional_literals)
+    return code_lines
+
+
+FOLD_OPERATORS = {
+    'add', 'sub', 'mul', 'div', 'mod', 'eq', 'neq', 'and', 'band', 'or', 'bor', 'xor', 'lshift', 'rshift',
+    'lt', 'leq', 'gt', 'geq',
+}
+LIST_ITEM = "__item"
+
+
+class RecursionShape(Enum):
+    FILTER = 0
+    MAP = 1
+    FOLD = 2
+
+
+@dataclass(frozen=True)
+class ListRecursion:
+    shape: RecursionShape
+    lst: str
+    item: Rvalue
+    keep: bool = True
+    operator: str = None
+    init: Rvalue = None
+    right: bool = True
+
+
+def is_call_of(rvalue, identifier, count):
+    return rvalue.type == RvalueType.CALL and rvalue.local_type is None and rvalue.value.identifier == identifier \
+        and len(rvalue.value.arguments) == count
+
+
+def is_local_of(rvalue, name):
+    return rvalue.type == RvalueType.LOCAL_VARIABLE and rvalue.value.name == name
+
+
+def is_list_call_of(rvalue, identifier, lst):
+    return is_call_of(rvalue, identifier, 1) and is_local_of(rvalue.value.arguments[0], lst)
+
+
+def is_empty_list(rvalue):
+    return is_call_of(rvalue, 'list', 0)
+
+
+def is_recursive_call(rvalue, func_lit, lst):
+    if not is_call_of(rvalue, func_lit.name, len(func_lit.args)):
+        return False
+    for name, argument in zip(func_lit.args, rvalue.value.arguments):
+        if not (is_list_call_of(argument, 'tail', lst) if name == lst else is_local_of(argument, name)):
+            return False
+    return True
+
+
+def uses_local(rvalue, name):
+    if rvalue.type == RvalueType.LOCAL_VARIABLE:
+        return rvalue.value.name == name
+    return rvalue.type == RvalueType.CALL and any(uses_local(argument, name) for argument in rvalue.value.arguments)
+
+
+def substitute_list_head(rvalue, lst, item):
+    if is_list_call_of(rvalue, 'head', lst):
+        return item
+    if rvalue.type == RvalueType.LOCAL_VARIABLE:
+        return None if rvalue.value.name == lst else rvalue
+    if rvalue.type != RvalueType.CALL:
+        return rvalue
+    arguments = []
+    for argument in rvalue.value.arguments:
+        argument = substitute_list_head(argument, lst, item)
+        if argument is None:
+            return None
+        arguments.append(argument)
+    return Rvalue.make(
+        RvalueType.CALL, Call(rvalue.value.identifier, tuple(arguments)), rvalue.variable_type, rvalue.local_type
+    )
+
+
+def get_result_type(rvalue):
+    if isinstance(rvalue.local_type, VariableType):
+        return rvalue.local_type.return_type
+    return rvalue.variable_type
+
+
+def get_list_item(rvalue, lst):
+    if get_result_type(rvalue) != VariableType.NUMERIC:
+        return None
+    return substitute_list_head(rvalue, lst, Rvalue.make(
+        RvalueType.LOCAL_VARIABLE, LocalVariable(LIST_ITEM, VariableType.NUMERIC), VariableType.NUMERIC
+    ))
+
+
+def get_recursion_base(func_lit, specializations, lst):
+    body = func_lit.rvalue
+    if not specializations:
+        if body.type != RvalueType.CALL or body.value.identifier not in LAZY_BRANCH_IDENTIFIERS \
+                or len(body.value.arguments) != 3:
+            return None, None
+        condition, base, step = body.value.arguments
+        if not is_call_of(condition, 'eq', 2):
+            return None, None
+        left, right = condition.value.arguments
+        if not (is_list_call_of(left, 'size', lst) and get_constant(right) == 0) \
+                and not (is_list_call_of(right, 'size', lst) and get_constant(left) == 0):
+            return None, None
+        return base, step
+    if len(specializations) != 1:
+        return None, None
+    specialization = specializations[0]
+    if len(specialization.parameters) != len(func_lit.args):
+        return None, None
+    for name, parameter in zip(func_lit.args, specialization.parameters):
+        if name == lst:
+            if parameter.type != FuncLitSpecArgType.RVALUE or not is_empty_list(parameter.value):
+                return None, None
+        elif parameter.type != FuncLitSpecArgType.FREE_VARIABLE or parameter.value.name != name:
+            return None, None
+    return specialization.rvalue, body
+
+
+def match_list_recursion(func_lit, specializations):
+    for lst, arg_type in func_lit.args.items():
+        if arg_type != VariableType.TYPE:
+            continue
+        base, step = get_recursion_base(func_lit, specializations, lst)
+        if base is None or step.type != RvalueType.CALL or uses_local(base, lst):
+            continue
+        identifier = step.value.identifier
+        arguments = step.value.arguments
+        if func_lit.func_lit_type == VariableType.TYPE and is_empty_list(base):
+            if is_call_of(step, 'tif', 3) and is_recursive_call(arguments[1], func_lit, lst) \
+                    and is_call_of(arguments[2], 'cons', 2) and arguments[2].value.arguments[1] is arguments[1] \
+                    and is_list_call_of(arguments[2].value.arguments[0], 'head', lst):
+                item = get_list_item(arguments[0], lst)
+                if item is not None:
+                    return ListRecursion(RecursionShape.FILTER, lst, item, keep=False)
+            if is_call_of(step, 'tif', 3) and is_recursive_call(arguments[2], func_lit, lst) \
+                    and is_call_of(arguments[1], 'cons', 2) and arguments[1].value.arguments[1] is arguments[2] \
+                    and is_list_call_of(arguments[1].value.arguments[0], 'head', lst):
+                item = get_list_item(arguments[0], lst)
+                if item is not None:
+                    return ListRecursion(RecursionShape.FILTER, lst, item)
+            if is_call_of(step, 'cons', 2) and is_recursive_call(arguments[1], func_lit, lst):
+                item = get_list_item(arguments[0], lst)
+                if item is not None:
+                    return ListRecursion(RecursionShape.MAP, lst, item)
+        elif func_lit.func_lit_type == VariableType.NUMERIC and get_result_type(base) == VariableType.NUMERIC \
+                and identifier in FOLD_OPERATORS and is_call_of(step, identifier, 2):
+            for right in (True, False):
+                value, recursive_call = arguments if right else reversed(arguments)
+                item = get_list_item(value, lst)
+                if is_recursive_call(recursive_call, func_lit, lst) and item is not None:
+                    return ListRecursion(RecursionShape.FOLD, lst, item, operator=identifier, init=base, right=right)
+    return None
+
+
+def get_specializations(code_lines):
+    specializations = defaultdict(list)
+    for line_type, atomic_obj, _ in code_lines:
+        if line_type == LineType.FUNC_LIT_SPECIALIZATION:
+            specializations[atomic_obj.name].append(atomic_obj)
+    return specializations
+
+
+def lower_code_line(code_line, specializations):
+    if code_line.line_type != LineType.FUNC_LIT:
+        return code_line
+    func_lit = code_line.object
+    recursion = match_list_recursion(func_lit, specializations.get(func_lit.name, ()))
+    if recursion == func_lit.recursion:
+        return code_line
+    func_lit = copy.copy(func_lit)
+    func_lit.recursion = recursion
+    return code_line._replace(object=func_lit)
+
+
+def lower_list_recursion(code_lines):
+    specializations = get_specializations(code_lines)
+    return [lower_code_line(code_line, specializations) for code_line in code_lines]
+
+
+def get_code_line_name(code_line):
+    if code_line.line_type == LineType.ASSIGNMENT:
+        return code_line.object.left_op
+    return code_line.object.name
+
+
+def get_referenced_names(code_line):
+    line_type, atomic_obj, _ = code_line
+    if line_type == LineType.ASSIGNMENT:
+        pending = [atomic_obj.right_op]
+    elif line_type == LineType.FUNC_LIT:
+        pending = [atomic_obj.rvalue]
+    else:
+        pending = [atomic_obj.rvalue] + [
+            parameter.value for parameter in atomic_obj.parameters if parameter.type == FuncLitSpecArgType.RVALUE
+        ]
+    names = set()
+    while pending:
+        rvalue = pending.pop()
+        if rvalue.type == RvalueType.VARIABLE_VALUE:
+            if rvalue.variable_type == VariableType.FUNCTION_NOT_SET:
+                names.add(purify_name(rvalue.value.name))
+            else:
+                names.add(rvalue.value.name)
+        elif rvalue.type == RvalueType.CALL:
+            if rvalue.local_type is None:
+                names.add(rvalue.value.identifier)
+            pending.extend(rvalue.value.arguments)
+    return names
+
+
+def get_live_lines(code_lines):
+    definitions = defaultdict(list)
+    pending = []
+    for i, code_line in enumerate(code_lines):
+        name = get_code_line_name(code_line)
+        if name == 'null':
+            pending.append(i)
+        else:
+            definitions[name].append(i)
+    live = set(pending)
+    while pending:
+        for name in get_referenced_names(code_lines[pending.pop()]):
+            for i in definitions.pop(name, ()):
+                live.add(i)
+                pending.append(i)
+    return live
+
+
+def eliminate_dead_code(code_lines):
+    live = get_live_lines(code_lines)
+    return [code_line for i, code_line in enumerate(code_lines) if i in live]
+
+
+def translate_left_op(assignment: Assignment, tag=""):
     if assignment.right_op.variable_type == VariableType.NUMERIC:
-        return """struct {} {{{{
+        return """struct {}{} {{{{
     const static long long value = {{}};
-}}}};\n""".format(assignment.left_op)
+}}}};\n""".format(assignment.left_op, tag)
     elif assignment.right_op.variable_type == VariableType.TYPE:
-        return """struct {} {{{{
+        return """struct {}{} {{{{
     using type = {{}};
-}}}};\n""".format(assignment.left_op)
+}}}};\n""".format(assignment.left_op, tag)
     else:
         raise TranslationError("Unknown assignment rvalue type or trying assign null to a variable")
 
 
-def translate_right_op(variables, functional_literals, right_op):
-    if right_op.type == RvalueType.NUMERIC_LITERAL:
-        return str(right_op.value.value)
-    elif right_op.type == RvalueType.VARIABLE_VALUE:
-        if right_op.variable_type == VariableType.FUNCTION_NOT_SET:
-            return "_" + purify_name(right_op.value.name)
-        return "{}::{}".format(
-            right_op.value.name,
-            translate_variable_type(variables[purify_name(right_op.value.name)].type)
+class BranchThunks:
+    def __init__(self, args, prefix, tag=""):
+        self.args = args
+        self.prefix = prefix
+        self.tag = tag
+        self.definitions = []
+
+    def add(self, result_type, expression):
+        name = "{}_{}".format(self.prefix, len(self.definitions))
+        self.definitions.append(
+            translate_struct(translate_signature(self.args), name, result_type, expression, self.tag)
         )
-    elif right_op.type == RvalueType.CALL:
-        identifier = right_op.value.identifier
-        arguments = right_op.value.arguments
-        translated_args = []
+        return "{}<{}>".format(name, ', '.join(self.args))
+
+
+def translate_struct(signature, name, result_type, expression, tag=""):
+    if result_type == VariableType.NUMERIC:
+        return """{}
+struct {}{} {{
+    const static long long value = {};
+}};\n""".format(signature, name, tag, expression)
+    else:
+        return """{}
+struct {}{} {{
+    using type = {};
+}};\n""".format(signature, name, tag, expression)
+
+
+def is_constexpr_call(right_op, functional_literals, options):
+    return options.arithmetic == ArithmeticBackend.CONSTEXPR and right_op.type == RvalueType.CALL \
+        and right_op.value.identifier in CONSTEXPR_IDENTIFIERS and right_op.value.identifier in BUILT_IN_IDENTIFIERS \
+        and right_op.value.identifier not in functional_literals
+
+
+def translate_branch_thunk(variables, functional_literals, branch, result_type, thunks, options):
+    if branch.type == RvalueType.VARIABLE_VALUE:
+        return branch.value.name
+    elif branch.type == RvalueType.CALL and not is_constexpr_call(branch, functional_literals, options):
+        if thunks is not None:
+            return thunks.add(
+                result_type, translate_right_op(variables, functional_literals, branch, thunks, options)
+            )
+        return translate_call(variables, functional_literals, branch, thunks, options)[1]
+    wrapper = "__value" if result_type == VariableType.NUMERIC else "__identity"
+    return "{}<{}>".format(wrapper, translate_right_op(variables, functional_literals, branch, thunks, options))
+
+
+def translate_call(variables, functional_literals, right_op, thunks=None, options=DEFAULT_OPTIONS):
+    count_event("calls_translated")
+    identifier = right_op.value.identifier
+    arguments = right_op.value.arguments
+    translated_args = []
+    if identifier in LAZY_BRANCH_IDENTIFIERS:
+        result_type = BUILT_IN_IDENTIFIERS[identifier]
+        translated_args.append(translate_right_op(variables, functional_literals, arguments[0], thunks, options))
+        for arg in arguments[1:]:
+            translated_args.append(
+                translate_branch_thunk(variables, functional_literals, arg, result_type, thunks, options)
+            )
+    else:
         for arg in arguments:
-            translated_args.append(translate_right_op(variables, functional_literals, arg))
+            translated_args.append(translate_right_op(variables, functional_literals, arg, thunks, options))
 
-        if identifier in BUILT_IN_IDENTIFIERS:
-            result_type = BUILT_IN_IDENTIFIERS[identifier]
+    if is_constexpr_call(right_op, functional_literals, options):
+        return "", "__{}_fn({})".format(identifier, ', '.join(translated_args)), ""
+    elif identifier in BUILT_IN_IDENTIFIERS and right_op.local_type is None and identifier not in functional_literals:
+        result_type = BUILT_IN_IDENTIFIERS[identifier]
 
-            if result_type == VariableType.TYPE:
-                suffix = "::type"
-                prefix = "typename "
+        if result_type == VariableType.TYPE:
+            suffix = "::type"
+            prefix = "typename "
+        else:
+            suffix = "::" + translate_variable_type(result_type)
+            prefix = ""
+        return prefix, "__{}<{}>".format(identifier, ', '.join(translated_args)), suffix
+    elif right_op.local_type is not None:
+        result_type = right_op.local_type
+        if result_type == VariableType.TYPE:
+            suffix = "::type"
+            prefix = "typename "
+        else:
+            if isinstance(result_type, VariableType):
+                suffix = "::" + translate_variable_type(result_type.return_type)
             else:
                 suffix = "::" + translate_variable_type(result_type)
-                prefix = ""
-            return "{}__{}<{}>{}".format(prefix, identifier, ', '.join(translated_args), suffix)
-        elif identifier in right_op.local_vars:
-            result_type = right_op.local_vars[identifier]
-            if result_type == VariableType.TYPE:
-                suffix = "::type"
-                prefix = "typename "
-            else:
-                if isinstance(result_type, VariableType):
-                    suffix = "::" + translate_variable_type(result_type.return_type)
-                else:
-                    suffix = "::" + translate_variable_type(result_type)
-                prefix = ""
-            if translated_args:
-                return "{}{}<{}>{}".format(prefix, identifier, ', '.join(translated_args), suffix)
-            else:
-                return "{}{}{}".format(prefix, identifier, suffix)
+            prefix = ""
+        if translated_args:
+            return prefix, "{}<{}>".format(identifier, ', '.join(translated_args)), suffix
+        else:
+            return prefix, identifier, suffix
 
-        elif identifier in functional_literals:
-            result_type = functional_literals[identifier]
-            if result_type == VariableType.TYPE:
-                suffix = "::type"
-                prefix = "typename "
-            else:
-                suffix = "::" + translate_variable_type(result_type)
-                prefix = ""
-            if translated_args:
-                return "{}_{}<{}>{}".format(prefix, identifier, ', '.join(translated_args), suffix)
-            else:
-                return "{}_{}{}".format(prefix, identifier, suffix)
+    elif identifier in functional_literals:
+        result_type = functional_literals[identifier]
+        if result_type == VariableType.TYPE:
+            suffix = "::type"
+            prefix = "typename "
+        else:
+            suffix = "::" + translate_variable_type(result_type)
+            prefix = ""
+        if translated_args:
+            return prefix, "_{}<{}>".format(identifier, ', '.join(translated_args)), suffix
         else:
-            raise TranslationError(
-                "Identifier '{}' is not contains in built-in-identifires or declared functional literals".format(
-                    identifier
-                )
+            return prefix, "_{}".format(identifier), suffix
+    else:
+        raise TranslationError(
+            "Identifier '{}' is not contains in built-in-identifires or declared functional literals".format(
+                identifier
             )
+        )
+
+
+def translate_right_op(variables, functional_literals, right_op, thunks=None, options=DEFAULT_OPTIONS):
+    if thunks is not None and right_op.has_branch:
+        return translate_rvalue(variables, functional_literals, right_op, thunks, options)
+    cached = right_op.cpp
+    if cached is not None and cached[0] is variables and cached[1] is functional_literals and cached[2] == options:
+        return cached[3]
+    cpp = translate_rvalue(variables, functional_literals, right_op, thunks, options)
+    right_op.cpp = (variables, functional_literals, options, cpp)
+    return cpp
 
+
+def translate_rvalue(variables, functional_literals, right_op, thunks=None, options=DEFAULT_OPTIONS):
+    if right_op.type == RvalueType.NUMERIC_LITERAL:
+        return str(right_op.value.value)
+    elif right_op.type == RvalueType.VARIABLE_VALUE:
+        if right_op.variable_type == VariableType.FUNCTION_NOT_SET:
+            return "_" + purify_name(right_op.value.name)
+        return "{}::{}".format(
+            right_op.value.name,
+            translate_variable_type(variables[purify_name(right_op.value.name)].type)
+        )
+    elif right_op.type == RvalueType.CALL:
+        return ''.join(translate_call(variables, functional_literals, right_op, thunks, options))
     elif right_op.type == RvalueType.LOCAL_VARIABLE:
-        return right_op.raw_rvalue
+        return right_op.value.name
     else:
         raise ParsingError("Unknown rvalue type: '{}'".format(right_op))
 
 
-def translate_print_func(variables, functional_literals, right_op):
+def translate_print_func(variables, functional_literals, right_op, options=DEFAULT_OPTIONS):
     if right_op.type != RvalueType.CALL:
         raise TranslationError("Can not translate print as non-call")
-    args = []
-    for arg in right_op.value.arguments:
-        args.append(translate_right_op(variables, functional_literals, arg))
-    if right_op.value.arguments[0].variable_type == VariableType.TYPE:
-        return '    __print<' + ', '.join(args) + '>();'
-    else:
-        return '    cout << ' + ', '.join(args) + '<< endl;'
+    if len(right_op.value.arguments) != 1:
+        raise TranslationError("print takes exactly one argument")
+    arg = right_op.value.arguments[0]
+    translated_arg = translate_right_op(variables, functional_literals, arg, options=options)
+    if arg.variable_type == VariableType.TYPE:
+        return "__format_list<{}>".format(translated_arg)
+    return "__format_value<{}>".format(translated_arg)
+
+
+def translate_output(formatters):
+    if not formatters:
+        return ""
+    return "    __write<\n{}\n    >();".format(',\n'.join("        " + formatter for formatter in formatters))
 
 
 NULL_TRANSLATION_FUNCS = {
@@ -606,98 +1438,519 @@ def translate_template_arg_type(arg_type):
     return translate_signature(arg_type.args, True)
 
 
-def translate_functional_literal(variables, functional_literals, func_lit: FunctionalLiteral):
-    result = [translate_signature(func_lit.args)]
-    if func_lit.func_lit_type == VariableType.NUMERIC:
-        result.append("""struct _{} {{
-    const static long long value = {};
-}};\n""".format(func_lit.name, translate_right_op(variables, functional_literals, func_lit.rvalue)))
+def translate_list_recursion(variables, functional_literals, func_lit: FunctionalLiteral, thunk_prefix,
+                             options=DEFAULT_OPTIONS, tag=""):
+    recursion = func_lit.recursion
+    signature = translate_signature(func_lit.args)
+    item_args = {name: arg_type for name, arg_type in func_lit.args.items() if name != recursion.lst}
+    item_args[LIST_ITEM] = VariableType.NUMERIC
+    item_name = "_{}{}".format(func_lit.name, LIST_ITEM)
+    item_thunks = BranchThunks(item_args, thunk_prefix + "_item", tag)
+    translated_item = translate_right_op(variables, functional_literals, recursion.item, item_thunks, options)
+    result = ["{}\nstruct _{};\n".format(signature, func_lit.name)]
+    result.extend(item_thunks.definitions)
+    result.append(translate_struct(
+        translate_signature(item_args), item_name, VariableType.NUMERIC, translated_item, tag
+    ))
+
+    if recursion.shape == RecursionShape.FILTER:
+        expression = "using type = typename __filter<{}, __apply, {}>::type;".format(
+            recursion.lst, int(recursion.keep)
+        )
+    elif recursion.shape == RecursionShape.MAP:
+        expression = "using type = typename __map<{}, __apply>::type;".format(recursion.lst)
     else:
-        result.append("""struct _{} {{
-    using type = {};
-}};\n""".format(func_lit.name, translate_right_op(variables, functional_literals, func_lit.rvalue)))
+        thunks = BranchThunks(func_lit.args, thunk_prefix, tag)
+        init = translate_right_op(variables, functional_literals, recursion.init, thunks, options)
+        result.extend(thunks.definitions)
+        expression = "const static long long value = __fold_op<{}, __apply, __{}_fn, {}, {}>::value;".format(
+            recursion.lst, recursion.operator, init, int(recursion.right)
+        )
+    result.append("""{}
+struct _{}{} {{
+    template<long long {}>
+    using __apply = {}<{}>;
+
+    {}
+}};\n""".format(signature, func_lit.name, tag, LIST_ITEM, item_name, ', '.join(item_args), expression))
+    return '\n'.join(result)
+
+
+def translate_functional_literal(variables, functional_literals, func_lit: FunctionalLiteral, thunk_prefix,
+                                 options=DEFAULT_OPTIONS, tag=""):
+    if func_lit.recursion is not None:
+        return translate_list_recursion(variables, functional_literals, func_lit, thunk_prefix, options, tag)
+    signature = translate_signature(func_lit.args)
+    thunks = BranchThunks(func_lit.args, thunk_prefix, tag) if func_lit.args else None
+    translated_rvalue = translate_right_op(variables, functional_literals, func_lit.rvalue, thunks, options)
+    result = []
+    if thunks is not None and thunks.definitions:
+        result.append("{}\nstruct _{};\n".format(signature, func_lit.name))
+        result.extend(thunks.definitions)
+    result.append(translate_struct(signature, "_" + func_lit.name, func_lit.func_lit_type, translated_rvalue, tag))
     return '\n'.join(result)
 
 
-def translate_func_lit_spec(variables, func_lit_types, func_lit_spec: FunctionalLiteralSpecialization):
+def translate_func_lit_spec(variables, func_lit_types, func_lit_spec: FunctionalLiteralSpecialization, thunk_prefix,
+                            options=DEFAULT_OPTIONS, tag=""):
     tplt_args = ', '.join(
         "{} {}".format(translate_template_arg_type(type), name) for name, type in func_lit_spec.local_vars.items()
     )
+    thunks = BranchThunks(func_lit_spec.local_vars, thunk_prefix, tag) if func_lit_spec.local_vars else None
     parameters = []
     for parameter in func_lit_spec.parameters:
         if parameter.type == FuncLitSpecArgType.FREE_VARIABLE:
             parameters.append(parameter.value.name)
         else:
-            parameters.append(translate_right_op(variables, func_lit_types, parameter.value))
+            parameters.append(translate_right_op(variables, func_lit_types, parameter.value, options=options))
     translated_pars = ', '.join(parameters)
-    translated_rvalue = translate_right_op(variables, func_lit_types, func_lit_spec.rvalue)
+    translated_rvalue = translate_right_op(variables, func_lit_types, func_lit_spec.rvalue, thunks, options)
+    result = thunks.definitions if thunks is not None else []
     if func_lit_spec.rvalue.variable_type == VariableType.NUMERIC:
-        return """template<{}>
-struct _{}<{}> {{
+        result.append("""template<{}>
+struct _{}<{}>{} {{
     const static long long value = {};
-}};\n""".format(tplt_args, func_lit_spec.name, translated_pars, translated_rvalue)
+}};\n""".format(tplt_args, func_lit_spec.name, translated_pars, tag, translated_rvalue))
     else:
-        return """template<{}>
-struct _{}<{}> {{
+        result.append("""template<{}>
+struct _{}<{}>{} {{
     using type = {};
-}};\n""".format(tplt_args, func_lit_spec.name, translated_pars, translated_rvalue)
-
+}};\n""".format(tplt_args, func_lit_spec.name, translated_pars, tag, translated_rvalue))
+    return '\n'.join(result)
 
-def build_cpp_code(variables, code_lines, functional_literals):
-    body_code = []
-    main_func_code = []
 
-    with open("vta_header.cpp") as vta_header_file:
-        body_code.append(vta_header_file.read())
+TEMPLATE_CACHE = {}
+
+
+def read_template(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = TEMPLATE_CACHE.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as template_file:
+            cached = (mtime, template_file.read())
+        TEMPLATE_CACHE[path] = cached
+    return cached[1]
+
+
+STDLIB_DEFINITION_TEMPLATE = re.compile(r"(?:struct|void|long long) (__\w+)")
+STDLIB_NAME_TEMPLATE = re.compile(r"\b__\w+")
+STDLIB_BLOCKS_CACHE = {}
+STDLIB_BLOCKS_CACHE_SIZE = 4
+
+
+def get_stdlib_blocks(stdlib):
+    blocks = STDLIB_BLOCKS_CACHE.get(stdlib)
+    if blocks is None:
+        blocks = []
+        lines = []
+        depth = 0
+        separator = ''
+        for line in stdlib.split('\n'):
+            if not lines and not line.strip():
+                separator += '\n'
+                continue
+            lines.append(line)
+            depth += line.count('{') - line.count('}')
+            if depth == 0 and line.rstrip().endswith((';', '}', '*/')):
+                definition = '\n'.join(lines)
+                name = STDLIB_DEFINITION_TEMPLATE.search(definition)
+                name = name.group(1) if name is not None else None
+                blocks.append((name, set(STDLIB_NAME_TEMPLATE.findall(definition)), separator, definition))
+                lines = []
+                separator = '\n'
+        if len(STDLIB_BLOCKS_CACHE) >= STDLIB_BLOCKS_CACHE_SIZE:
+            STDLIB_BLOCKS_CACHE.clear()
+        STDLIB_BLOCKS_CACHE[stdlib] = blocks
+    return blocks
+
+
+def prune_stdlib(stdlib, code):
+    blocks = get_stdlib_blocks(stdlib)
+    definitions = defaultdict(list)
+    for name, references, _, _ in blocks:
+        definitions[name].append(references)
+    pending = set(STDLIB_NAME_TEMPLATE.findall(code))
+    live = set()
+    while pending:
+        name = pending.pop()
+        live.add(name)
+        for references in definitions.pop(name, ()):
+            pending |= references - live
+    return ''.join(
+        separator + definition for name, _, separator, definition in blocks if name is None or name in live
+    ) + '\n'
+
+
+def replace_stdlib_lists(stdlib, lists):
+    replaced = {name for name, _, _, _ in get_stdlib_blocks(lists) if name is not None}
+    result = []
+    inserted = False
+    for name, _, separator, definition in get_stdlib_blocks(stdlib):
+        if name not in replaced:
+            result.append(separator + definition)
+        elif not inserted:
+            result.append(separator + lists.strip('\n'))
+            inserted = True
+    return ''.join(result) + '\n'
+
+
+def translate_code_line(variables, functional_literals, code_line, options=DEFAULT_OPTIONS):
+    line_type, atomic_obj, line_number = code_line
+    if options.module is None:
+        thunk_prefix = "__thunk_{}".format(line_number)
+    else:
+        thunk_prefix = "__thunk_{}_{}".format(options.module, line_number)
+    tag = " : __vta_line<{}>".format(line_number) if options.line_tags else ""
+    if line_type == LineType.FUNC_LIT:
+        return translate_functional_literal(
+            variables, functional_literals, atomic_obj, thunk_prefix, options, tag
+        ), None
+    elif line_type == LineType.ASSIGNMENT:
+        if atomic_obj.left_op == 'null':
+            identifier = atomic_obj.right_op.value.identifier
+            if identifier not in NULL_TRANSLATION_FUNCS:
+                raise TranslationError("Can not translate non-null function '{}'".format(identifier))
+            return None, NULL_TRANSLATION_FUNCS[identifier](
+                variables, functional_literals, atomic_obj.right_op, options
+            )
+        else:
+            left_op = translate_left_op(atomic_obj, tag)
+            right_op = translate_right_op(variables, functional_literals, atomic_obj.right_op, options=options)
+            return left_op.format(right_op), None
+    elif line_type == LineType.FUNC_LIT_SPECIALIZATION:
+        return translate_func_lit_spec(
+            variables, functional_literals, atomic_obj, thunk_prefix, options, tag
+        ), None
+    else:
+        raise TranslationError("Unknown line_type: '{}'".format(line_type))
 
-    with open("vta_stdlib.cpp") as vta_stdlib_file:
-        body_code.append(vta_stdlib_file.read())
 
-    for line_type, atomic_obj in code_lines:
-        if line_type == LineType.FUNC_LIT:
-            body_code.append(translate_functional_literal(variables, functional_literals, atomic_obj))
-        elif line_type == LineType.ASSIGNMENT:
-            if atomic_obj.left_op == 'null':
-                identifier = atomic_obj.right_op.value.identifier
-                if identifier not in NULL_TRANSLATION_FUNCS:
-                    raise TranslationError("Can not translate non-null function '{}'".format(identifier))
-                main_func_code.append(NULL_TRANSLATION_FUNCS[identifier](
-                    variables, functional_literals, atomic_obj.right_op
-                ))
-            else:
-                left_op = translate_left_op(atomic_obj)
-                right_op = translate_right_op(variables, functional_literals, atomic_obj.right_op)
-                body_code.append(left_op.format(right_op))
-        elif line_type == LineType.FUNC_LIT_SPECIALIZATION:
-            body_code.append(translate_func_lit_spec(variables, functional_literals, atomic_obj))
-        else:
-            raise TranslationError("Unknown line_type: '{}'".format(line_type))
+def get_prelude(code, options=DEFAULT_OPTIONS):
+    if options.stdlib_include is not None:
+        return ['#include "{}"\n'.format(options.stdlib_include)]
+    stdlib = read_template("vta_stdlib.cpp")
+    if options.lists == ListBackend.ARRAY:
+        stdlib = replace_stdlib_lists(stdlib, read_template("vta_array_lists.cpp"))
+    if options.eliminate_dead_code:
+        stdlib = prune_stdlib(stdlib, '\n'.join(code))
+    return [read_template("vta_header.cpp"), stdlib]
 
-    with open("main_func.cpp") as main_func_file:
-        main_func_template = main_func_file.read()
-        body_code.append(main_func_template.format('\n'.join(main_func_code)))
 
-    return '\n'.join(body_code)
+def assemble_cpp_code(body_code, main_func_code, options=DEFAULT_OPTIONS):
+    output = translate_output(main_func_code)
+    prelude = get_prelude(itertools.chain(body_code, [output]), options)
+    main_func = read_template("main_func.cpp").format(output)
+    return '\n'.join(itertools.chain(prelude, body_code, [main_func]))
 
 
-def translate(source, stdin):
-    raw_code_lines = get_code_lines(source)
+def build_cpp_code(variables, code_lines, functional_literals, options=DEFAULT_OPTIONS):
+    body_code = []
+    main_func_code = []
+    for code_line in code_lines:
+        body, main_func = translate_code_line(variables, functional_literals, code_line, options)
+        if body is not None:
+            body_code.append(body)
+        if main_func is not None:
+            main_func_code.append(main_func)
+    return assemble_cpp_code(body_code, main_func_code, options)
+
+
+def split_imports(source):
+    lines = source.split('\n')
+    imports = []
+    for i, line in enumerate(lines):
+        match = IMPORT_TEMPLATE.match(line)
+        if match:
+            imports.append((i + 1, match.group(1)))
+            lines[i] = ""
+    return '\n'.join(lines), imports
+
+
+def resolve_imports(source, options=DEFAULT_OPTIONS):
+    source, imports = split_imports(source)
+    if not imports:
+        return source, options
+    import vta_modules
+    with timed_phase("resolve_imports"):
+        return source, vta_modules.load_imports(imports, options)
+
+
+def with_source_dir(options, source_path):
+    source_dir = os.path.dirname(os.path.abspath(source_path))
+    return dataclasses.replace(options, import_path=(source_dir,) + options.import_path)
+
+
+def seed_imports(variables, func_lit_types, imports):
+    for name, count, variable_type in imports.variables:
+        if name in func_lit_types:
+            raise ParsingError("'{}' is a functional literal here but an imported variable".format(name))
+        variable = variables.setdefault(name, Variable(name, variable_type))
+        variable.count = count
+        variable.type = variable_type
+    signatures = {}
+    for name, signature in imports.literals:
+        if name in func_lit_types or name in variables:
+            raise ParsingError("'{}' is already defined by an imported module".format(name))
+        variables[name] = Variable(name, VariableType.FUNCTION_NOT_SET)
+        func_lit_types[name] = signature.return_type
+        signatures[name] = signature
+    return signatures
+
+
+def init_variables(raw_code_lines):
     variables = {}
     for var_name, var_type in get_variables(raw_code_lines).items():
         variables[var_name] = Variable(var_name, LocalVariableType.get_by(var_type))
-    functional_literals = preparse_func_literals(raw_code_lines)
-    code_lines = parse_vta_code(variables, functional_literals, raw_code_lines, stdin)
-    return build_cpp_code(variables, code_lines, functional_literals)
+    return variables
+
+
+def parse_program(source, stdin, options=DEFAULT_OPTIONS):
+    with timed_phase("get_code_lines"):
+        raw_code_lines = get_code_lines(source)
+    count_event("code_lines", len(raw_code_lines))
+    with timed_phase("init_variables"):
+        variables = init_variables(raw_code_lines)
+    with timed_phase("preparse_func_literals"):
+        functional_literals = preparse_func_literals(raw_code_lines)
+    imported_signatures = None
+    if options.imports is not None:
+        imported_signatures = seed_imports(variables, functional_literals, options.imports)
+    with timed_phase("parse_vta_code"):
+        code_lines = parse_vta_code(variables, functional_literals, raw_code_lines, stdin)
+    if options.check_types:
+        with timed_phase("check_types"):
+            code_lines = check_types(code_lines, imported_signatures)
+    if options.fold_constants:
+        with timed_phase("fold_constants"):
+            code_lines = fold_constants(code_lines, functional_literals)
+    if options.lower_recursion:
+        with timed_phase("lower_list_recursion"):
+            code_lines = lower_list_recursion(code_lines)
+    if options.eliminate_dead_code:
+        with timed_phase("eliminate_dead_code"):
+            code_lines = eliminate_dead_code(code_lines)
+    return variables, code_lines, functional_literals
+
+
+def translate(source, stdin, options=DEFAULT_OPTIONS, stats=None):
+    with collect_stats(stats):
+        source, options = resolve_imports(source, options)
+        variables, code_lines, functional_literals = parse_program(source, stdin, options)
+        with timed_phase("build_cpp_code"):
+            cpp_code = build_cpp_code(variables, code_lines, functional_literals, options)
+        count_event("bytes_emitted", len(cpp_code.encode()))
+    return cpp_code
+
+
+def get_batch_sources(pattern):
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.vta")
+    return sorted(glob.glob(pattern))
+
+
+def get_batch_output_path(source_path, output_dir):
+    name = os.path.splitext(os.path.basename(source_path))[0] + ".cpp"
+    return os.path.join(output_dir or os.path.dirname(source_path), name)
+
+
+def translate_file(source_path, output_path, options=DEFAULT_OPTIONS):
+    input_path = os.path.splitext(source_path)[0] + ".in"
+    options = with_source_dir(options, source_path)
+    try:
+        with open(source_path) as source_file:
+            source = source_file.read()
+        if os.path.exists(input_path):
+            cpp_code = translate(source, TokenReader.from_path(input_path), options)
+        else:
+            cpp_code = translate(source, io.StringIO(), options)
+        with open(output_path, "w") as output_file:
+            output_file.write(cpp_code + "\n")
+    except (ParsingError, TranslationError, OSError) as e:
+        return source_path, output_path, str(e)
+    except Exception as e:
+        # e.g. RecursionError on a pathologically deep expression: fail this file, not the whole batch
+        return source_path, output_path, "{}: {}".format(type(e).__name__, e)
+    return source_path, output_path, None
+
+
+def compile_file(source_path, cpp_path):
+    binary_path = os.path.splitext(cpp_path)[0]
+    process = subprocess.run(
+        ["g++", "--std=c++17", cpp_path, "-o", binary_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        return source_path, binary_path, process.stdout
+    return source_path, binary_path, None
+
+
+def run_batch(pattern, jobs, output_dir=None, compile_outputs=False, options=DEFAULT_OPTIONS):
+    sources = get_batch_sources(pattern)
+    if not sources:
+        print("No .vta files match '{}'".format(pattern), file=sys.stderr)
+        return 1
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    failed = 0
+    with ProcessPoolExecutor(jobs) as translators, ThreadPoolExecutor(jobs) as compilers:
+        translations = [
+            translators.submit(translate_file, source_path, get_batch_output_path(source_path, output_dir), options)
+            for source_path in sources
+        ]
+        compilations = []
+        for future in as_completed(translations):
+            source_path, output_path, error = future.result()
+            if error is not None:
+                failed += 1
+                print("{}: {}".format(source_path, error), file=sys.stderr)
+            elif compile_outputs:
+                compilations.append(compilers.submit(compile_file, source_path, output_path))
+            else:
+                print("{} -> {}".format(source_path, output_path))
+        for future in as_completed(compilations):
+            source_path, binary_path, error = future.result()
+            if error is not None:
+                failed += 1
+                print("{}: compilation failed\n{}".format(source_path, error), file=sys.stderr)
+            else:
+                print("{} -> {}".format(source_path, binary_path))
+
+    print("{} of {} files processed successfully".format(len(sources) - failed, len(sources)), file=sys.stderr)
+    return 1 if failed else 0
 
 
 def main():
-    if len(sys.argv) <= 1:
+    parser = argparse.ArgumentParser(description="Translate a .vta program into C++ 17 variadic templates.")
+    parser.add_argument("source", nargs="?", help="input .vta file")
+    parser.add_argument(
+        "--arithmetic",
+        choices=[backend.value for backend in ArithmeticBackend],
+        default=ArithmeticBackend.STRUCT.value,
+        help="lower numeric built-ins to template structs (default) or to constexpr function calls",
+    )
+    parser.add_argument(
+        "--lists",
+        choices=[backend.value for backend in ListBackend],
+        default=ListBackend.PACK.value,
+        help="represent lists as bare parameter packs (default) or as packs with a static constexpr array of items",
+    )
+    parser.add_argument(
+        "--stdlib-include",
+        metavar="HEADER",
+        help="#include HEADER (e.g. a precompiled vta_header.cpp + vta_stdlib.cpp) instead of inlining the stdlib",
+    )
+    parser.add_argument(
+        "--no-dce",
+        action="store_true",
+        help="keep lines not reachable from any print and the whole stdlib in the output",
+    )
+    parser.add_argument(
+        "--no-fold",
+        action="store_true",
+        help="emit numeric built-ins with known arguments as template instantiations instead of folding them",
+    )
+    parser.add_argument(
+        "--no-lower",
+        action="store_true",
+        help="translate recursive filter, map and fold literals over lists as written instead of as pack expansions",
+    )
+    parser.add_argument(
+        "--no-check",
+        action="store_true",
+        help="skip the static type check of calls, specializations and function arguments before translation",
+    )
+    parser.add_argument(
+        "-I",
+        "--import-path",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="also look for imported modules in DIR (after the importing file's directory)",
+    )
+    parser.add_argument(
+        "--precompile-imports",
+        action="store_true",
+        help="precompile the header that includes the imported modules with g++",
+    )
+    parser.add_argument(
+        "--input",
+        metavar="FILE",
+        help="take read() and readlist() input from FILE (memory-mapped) instead of stdin",
+    )
+    parser.add_argument(
+        "--evaluate",
+        action="store_true",
+        help="run the program in Python and print its output, compiling it with g++ only if that fails",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="DIR_OR_GLOB",
+        help="translate every .vta file in a directory (or matching a glob) into its own .cpp file",
+    )
+    parser.add_argument(
+        "--split",
+        type=int,
+        metavar="N",
+        help="write the program as a shared header, up to N part_K.cpp files, main.cpp and a Makefile",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes for --batch and --split"
+    )
+    parser.add_argument(
+        "--output-dir", help="directory for --batch or --split outputs (default: next to each source / <source>_parts)"
+    )
+    parser.add_argument("--compile", action="store_true", help="compile every --batch or --split output with g++")
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="print time per translation phase and translation counters to stderr, as a table or as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="compile the program and print template instantiation counts and compile time per source line",
+    )
+    args = parser.parse_args()
+    options = TranslationOptions(
+        arithmetic=ArithmeticBackend(args.arithmetic),
+        lists=ListBackend(args.lists),
+        stdlib_include=args.stdlib_include,
+        eliminate_dead_code=not args.no_dce,
+        fold_constants=not args.no_fold,
+        lower_recursion=not args.no_lower,
+        check_types=not args.no_check,
+        import_path=tuple(os.path.abspath(path) for path in args.import_path),
+        precompile_imports=args.precompile_imports,
+    )
+    if args.batch is not None:
+        sys.exit(run_batch(args.batch, args.jobs, args.output_dir, args.compile, options))
+    if args.source is None:
         print("Input .vta file is required as first cmd argument.")
         return
-    with open(sys.argv[1]) as file:
-        print(translate(file.read(), ""))
+    options = with_source_dir(options, args.source)
+    stdin = TokenReader(sys.stdin) if args.input is None else TokenReader.from_path(args.input)
+    if args.evaluate:
+        import evaluate
+        sys.exit(evaluate.run_program(args.source, stdin, options))
+    if args.split is not None:
+        import split
+        sys.exit(split.run_split(args.source, stdin, args.split, args.output_dir, args.compile, args.jobs, options))
+    if args.profile:
+        import vta_profile
+        sys.exit(vta_profile.run_profile(args.source, options, stdin))
+    stats = TranslationStats() if args.stats is not None else None
+    with open(args.source) as file:
+        print(translate(file.read(), stdin, options, stats))
+    if stats is not None:
+        print(stats.to_json() if args.stats == "json" else stats.format(), file=sys.stderr)
 
 
 if __name__ == '__main__':
-    main()
+    # Feature modules (split, evaluate, vta_modules, ...) import this file as `translate`; run that copy so that
+    # they share its enums and option classes instead of comparing against the ones of `__main__`.
+    import translate
+    translate.main()
 
@@ -1,9 +1,142 @@
 #!/bin/bash
 
-if [ "$#" -ne 1 ]; then
+CXX="${CXX:-g++}"
+CXXFLAGS="--std=c++17"
+CACHE_DIR="${VTA_CACHE_DIR:-${XDG_CACHE_HOME:-$HOME/.cache}/vartement}"
+CACHE_SIZE_LIMIT_KB="${VTA_CACHE_SIZE_LIMIT_KB:-524288}"
+
+use_cache=1
+if [ "$1" = "--no-cache" ]; then
+    use_cache=0
+    shift
+fi
+
+if [ "$#" -lt 1 ]; then
     echo "Input .vta file is required as first cmd argument."
-else
-    python3 translate.py $1>out.cpp || exit 1
-    g++ --std=c++17 out.cpp -o program || exit 1
-    echo \'$1\' successfully translated in \'out.cpp\' and compiled into \'program\'
+    echo "Usage: $0 [--no-cache] <filename>.vta [translate.py options]"
+    exit 1
 fi
+
+source_file=$1
+shift
+
+for arg in "$@"; do
+    case "$arg" in
+        --evaluate|--profile|--split|--split=*|--batch|--batch=*)
+            # these modes do not write a C++ program to stdout
+            echo "$arg is not supported by $0, run translate.py directly"
+            exit 1 ;;
+    esac
+done
+
+if grep -Eq '^[[:space:]]*import[[:space:]]' "$source_file"; then
+    # imported modules are cached by the translator, but their sources are not part of the program cache key
+    use_cache=0
+fi
+
+input_file=$(mktemp)
+trap 'rm -f "$input_file"' EXIT
+if grep -Eq '(^|[^a-zA-Z0-9])read(list)?[[:space:]]*\(' "$source_file"; then
+    cat > "$input_file"
+fi
+
+translate_and_compile() {
+    python3 translate.py "$source_file" "$@" < "$input_file" > out.cpp || exit 1
+    $CXX $CXXFLAGS out.cpp -o program || exit 1
+}
+
+build_pch() {
+    local key staging
+    key=$(
+        {
+            cat vta_header.cpp vta_stdlib.cpp
+            echo "$CXX $CXXFLAGS"
+            $CXX --version | head -n 1
+        } | sha256sum | cut -d ' ' -f 1
+    )
+    PCH_DIR="$CACHE_DIR/pch-$key"
+    if [ ! -f "$PCH_DIR/vta.hpp.gch" ]; then
+        mkdir -p "$CACHE_DIR"
+        staging=$(mktemp -d "$CACHE_DIR/.staging.XXXXXX")
+        {
+            cat vta_header.cpp
+            echo
+            cat vta_stdlib.cpp
+        } > "$staging/vta.hpp"
+        $CXX $CXXFLAGS -x c++-header "$staging/vta.hpp" -o "$staging/vta.hpp.gch" || exit 1
+        mv -T "$staging" "$PCH_DIR" 2>/dev/null || rm -rf "$staging"
+    fi
+    touch "$PCH_DIR"
+}
+
+translate_and_compile_with_pch() {
+    build_pch
+    python3 translate.py "$source_file" --stdlib-include vta.hpp "$@" < "$input_file" > out.cpp || exit 1
+    $CXX $CXXFLAGS -Winvalid-pch -I "$PCH_DIR" out.cpp -o program || exit 1
+}
+
+cache_key() {
+    local arg previous=
+    {
+        sha256sum < "$source_file"
+        sha256sum < "$input_file"
+        for arg in "$@"; do
+            if [ "$previous" = "--input" ]; then
+                sha256sum < "$arg"
+            fi
+            previous=$arg
+        done
+        # every module the translator may import (vta_stats.py, vta_modules.py, ...), not only translate.py
+        cat $(ls *.py | grep -v '^test_') vta_header.cpp vta_stdlib.cpp vta_array_lists.cpp main_func.cpp | sha256sum
+        echo "$CXX $CXXFLAGS -Winvalid-pch $*"
+        $CXX --version | head -n 1
+    } | sha256sum | cut -d ' ' -f 1
+}
+
+evict_cache() {
+    local total=0 size entry entries
+    # modules/ belongs to the translator's module cache and is never evicted here
+    entries=$(ls -tr "$CACHE_DIR" | grep -vx modules)
+    for entry in $entries; do
+        total=$((total + $(du -sk "$CACHE_DIR/$entry" | cut -f 1)))
+    done
+    for entry in $entries; do
+        if [ "$total" -le "$CACHE_SIZE_LIMIT_KB" ]; then
+            break
+        fi
+        size=$(du -sk "$CACHE_DIR/$entry" | cut -f 1)
+        rm -rf "${CACHE_DIR:?}/$entry"
+        total=$((total - size))
+    done
+}
+
+if [ "$use_cache" -eq 0 ]; then
+    translate_and_compile "$@"
+    echo \'$source_file\' successfully translated in \'out.cpp\' and compiled into \'program\'
+    exit 0
+fi
+
+entry="$CACHE_DIR/$(cache_key "$@")"
+if [ -f "$entry/out.cpp" ] && [ -f "$entry/program" ]; then
+    cp "$entry/out.cpp" out.cpp
+    cp "$entry/program" program
+    touch "$entry"
+    echo \'$source_file\' restored from cache into \'out.cpp\' and \'program\'
+    exit 0
+fi
+
+case " $* " in
+    *" --lists array "*|*" --lists=array "*)
+        # the precompiled header is built from the default pack-based stdlib
+        translate_and_compile "$@" ;;
+    *)
+        translate_and_compile_with_pch "$@" ;;
+esac
+
+mkdir -p "$CACHE_DIR"
+staging=$(mktemp -d "$CACHE_DIR/.staging.XXXXXX")
+cp out.cpp program "$staging"
+mv -T "$staging" "$entry" 2>/dev/null || rm -rf "$staging"
+evict_cache
+
+echo \'$source_file\' successfully translated in \'out.cpp\' and compiled into \'program\'
@@ -1,12 +1,98 @@
-import sys
+import itertools
+import mmap
+import re
+
+CHUNK_SIZE = 1 << 16
+NUMERIC_TOKEN_TEMPLATE = re.compile(r"^-?\d+$")
+NUMERIC_CHUNK_TEMPLATE = re.compile(r"(?:\s*-?\d+(?=\s|$))*\s*")
+NUMERIC_BYTES_TEMPLATE = re.compile(rb"(?:\s*-?\d+(?=\s|$))*\s*")
+TOKEN_BYTES_TEMPLATE = re.compile(rb"\S+")
+
+
+class TokenReader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.tokens = []
+        self.position = 0
+        self.validated = True
+        self.rest = ''
+        self.exhausted = False
+
+    @staticmethod
+    def from_path(path):
+        with open(path, 'rb') as input_file:
+            if not input_file.read(1):
+                return MappedTokenReader(b'')
+            return MappedTokenReader(mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def fill(self):
+        while self.position >= len(self.tokens) and not self.exhausted:
+            chunk = self.stream.read(CHUNK_SIZE)
+            if not chunk:
+                self.exhausted = True
+                text, self.rest = self.rest, ''
+            else:
+                text = self.rest + chunk
+                end = len(text)
+                while end > 0 and not text[end - 1].isspace():
+                    end -= 1
+                text, self.rest = text[:end], text[end:]
+            self.tokens = text.split()
+            self.position = 0
+            self.validated = NUMERIC_CHUNK_TEMPLATE.fullmatch(text) is not None
+
+    def next_token(self):
+        self.fill()
+        if self.position >= len(self.tokens):
+            return ''
+        self.position += 1
+        return self.tokens[self.position - 1]
+
+    def next_tokens(self, count=None):
+        result = []
+        while count is None or len(result) < count:
+            self.fill()
+            if self.position >= len(self.tokens):
+                break
+            end = len(self.tokens) if count is None else min(len(self.tokens), self.position + count - len(result))
+            tokens = self.tokens[self.position:end]
+            if not self.validated:
+                for token in tokens:
+                    if not NUMERIC_TOKEN_TEMPLATE.match(token):
+                        raise ValueError(token)
+            result.extend(tokens)
+            self.position = end
+        return result
+
+
+class MappedTokenReader(TokenReader):
+    def __init__(self, data):
+        super().__init__(None)
+        self.data = data
+        self.validated = NUMERIC_BYTES_TEMPLATE.fullmatch(data) is not None
+        self.matches = TOKEN_BYTES_TEMPLATE.finditer(data)
+
+    def fill(self):
+        if self.position >= len(self.tokens) and not self.exhausted:
+            self.tokens = [match.group().decode() for match in itertools.islice(self.matches, CHUNK_SIZE)]
+            self.position = 0
+            self.exhausted = not self.tokens
+
+
+def get_token_reader(stdin):
+    if isinstance(stdin, TokenReader):
+        return stdin
+    return TokenReader(stdin)
 
 
 def read_next_token(stdin):
+    if isinstance(stdin, TokenReader):
+        return stdin.next_token()
     c = ' '
     while c.isspace():
         c = stdin.read(1)
     res = []
-    while not c.isspace():
+    while c and not c.isspace():
         res.append(c)
         c = stdin.read(1)
     return ''.join(res).strip()
@@ -0,0 +1,31 @@
+/* packed-array lists */
+
+template <long long ...T>
+struct __list_ {
+    static constexpr long long items[sizeof...(T) + 1] = {T..., 0};
+    static const size_t length = sizeof...(T);
+};
+
+template <typename LIST>
+struct __head {
+    static_assert(LIST::length > 0, "head of an empty list");
+    static const long long value = LIST::items[0];
+};
+
+template <typename LIST>
+struct __tail_ {};
+
+template <long long H, long long ...T>
+struct __tail_<__list_<H, T...>> {
+    using type = __list_<T...>;
+};
+
+template <typename LIST>
+struct __tail {
+    using type = typename __tail_<LIST>::type;
+};
+
+template<typename lst, long long i>
+struct __get {
+    const static long long value = 0 <= i && i < (long long) lst::length ? lst::items[i] : __nan<>::value;
+};
@@ -1,3 +1,5 @@
+#include <cstdio>
 #include <iostream>
+#include <utility>
 
 using namespace std;
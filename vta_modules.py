@@ -0,0 +1,317 @@
+import dataclasses
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass
+
+import translate
+from translate import (
+    LineType, ListBackend, ParsingError, TranslationError, VariableType, get_func_lit_signatures, parse_program,
+    purify_name, read_template, replace_stdlib_lists, split_imports, translate_code_line,
+)
+from utils import TokenReader
+
+MODULE_EXTENSION = ".vta"
+INTERFACE_VERSION = 1
+TEMPLATE_FILES = ("vta_header.cpp", "vta_stdlib.cpp", "vta_array_lists.cpp")
+TYPE_NAMES = {VariableType.NUMERIC: "num", VariableType.TYPE: "type"}
+TYPES_BY_NAME = {name: var_type for var_type, name in TYPE_NAMES.items()}
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get("VTA_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "vartement")
+    return os.path.join(cache_dir, "modules")
+
+
+class ModuleInput(TokenReader):
+    # read() and readlist() are replaced by the input while parsing, but a module is translated once and cached
+    def __init__(self):
+        super().__init__(None)
+
+    def fill(self):
+        raise TranslationError("Modules can not read()")
+
+
+@dataclass(frozen=True)
+class ModuleInterface:
+    name: str
+    source: str
+    key: str
+    header: str
+    imports: tuple
+    variables: tuple
+    literals: tuple
+
+
+@dataclass(frozen=True)
+class ImportScope:
+    variables: tuple
+    literals: tuple
+
+
+def dump_type(var_type):
+    if isinstance(var_type, VariableType):
+        return {
+            "return": dump_type(var_type.return_type),
+            "args": [[name, dump_type(arg_type)] for name, arg_type in var_type.args.items()],
+        }
+    return TYPE_NAMES[var_type]
+
+
+def load_type(raw_type):
+    if isinstance(raw_type, dict):
+        return VariableType(load_type(raw_type["return"]), {name: load_type(arg) for name, arg in raw_type["args"]})
+    return TYPES_BY_NAME[raw_type]
+
+
+def dump_interface(interface):
+    return {
+        "version": INTERFACE_VERSION,
+        "name": interface.name,
+        "source": interface.source,
+        "key": interface.key,
+        "header": interface.header,
+        "imports": list(interface.imports),
+        "variables": [
+            {"name": name, "count": count, "type": dump_type(var_type), "origin": origin}
+            for name, count, var_type, origin in interface.variables
+        ],
+        "functional_literals": [
+            {"name": name, "signature": dump_type(signature), "origin": origin}
+            for name, signature, origin in interface.literals
+        ],
+    }
+
+
+def load_interface(raw_interface):
+    return ModuleInterface(
+        raw_interface["name"],
+        raw_interface["source"],
+        raw_interface["key"],
+        raw_interface["header"],
+        tuple(raw_interface["imports"]),
+        tuple(
+            (variable["name"], variable["count"], load_type(variable["type"]), variable["origin"])
+            for variable in raw_interface["variables"]
+        ),
+        tuple(
+            (literal["name"], load_type(literal["signature"]), literal["origin"])
+            for literal in raw_interface["functional_literals"]
+        ),
+    )
+
+
+def write_atomically(path, content):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".staging.")
+    try:
+        with os.fdopen(descriptor, "w") as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def find_module(name, search_path):
+    file_name = name if name.endswith(MODULE_EXTENSION) else name + MODULE_EXTENSION
+    for directory in search_path or (os.getcwd(),):
+        path = os.path.join(directory, file_name)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    raise ParsingError("Can not find module '{}' in {}".format(name, ', '.join(search_path or (os.getcwd(),))))
+
+
+def get_translator_hash():
+    digest = hashlib.sha256()
+    for path in (translate.__file__, __file__):
+        with open(path, "rb") as source_file:
+            digest.update(source_file.read())
+    for path in TEMPLATE_FILES:
+        digest.update(read_template(path).encode())
+    return digest.hexdigest()
+
+
+def get_options_key(options):
+    return "{} {} {} {} {} {}".format(
+        options.arithmetic.value, options.lists.value, options.fold_constants, options.lower_recursion,
+        options.check_types, options.line_tags,
+    )
+
+
+def get_prelude_header(options):
+    stdlib = read_template("vta_stdlib.cpp")
+    if options.lists == ListBackend.ARRAY:
+        stdlib = replace_stdlib_lists(stdlib, read_template("vta_array_lists.cpp"))
+    content = "#pragma once\n" + read_template("vta_header.cpp") + "\n" + stdlib
+    path = os.path.join(get_cache_dir(), "prelude-{}.hpp".format(hashlib.sha256(content.encode()).hexdigest()[:16]))
+    if not os.path.exists(path):
+        write_atomically(path, content)
+    return path
+
+
+def merge_exports(interfaces):
+    variables = defaultdict(dict)
+    literals = {}
+    for interface in interfaces:
+        for name, signature, origin in interface.literals:
+            if literals.setdefault(name, (name, signature, origin))[2] != origin:
+                raise TranslationError("Functional literal '{}' is defined by two imported modules".format(name))
+        for name, count, var_type, origin in interface.variables:
+            if variables[name].setdefault(count, (name, count, var_type, origin))[3] != origin:
+                raise TranslationError("Variable '{}' is defined by two imported modules".format(name))
+    conflicts = literals.keys() & variables.keys()
+    if conflicts:
+        raise TranslationError(
+            "'{}' is a functional literal in one imported module and a variable in another".format(min(conflicts))
+        )
+    return tuple(versions[max(versions)] for versions in variables.values()), tuple(literals.values())
+
+
+def get_scope(interfaces):
+    variables, literals = merge_exports(interfaces)
+    return ImportScope(
+        tuple((name, count, var_type) for name, count, var_type, _ in variables),
+        tuple((name, signature) for name, signature, _ in literals),
+    )
+
+
+class ModuleLoader:
+    def __init__(self, options):
+        self.options = options
+        self.translator_hash = get_translator_hash()
+        self.interfaces = {}
+        self.loading = []
+
+    def load(self, name, search_path, line_number=None):
+        try:
+            path = find_module(name, search_path)
+        except ParsingError as e:
+            e.line_number = line_number
+            raise
+        interface = self.interfaces.get(path)
+        if interface is not None:
+            return interface
+        if path in self.loading:
+            cycle = self.loading[self.loading.index(path):] + [path]
+            raise TranslationError("Import cycle: {}".format(" -> ".join(cycle)))
+        self.loading.append(path)
+        try:
+            interface = self.load_module(path)
+        except (ParsingError, TranslationError) as e:
+            module_line = getattr(e, "line_number", None)
+            error = type(e)("{}: {}".format(path if module_line is None else "{}:{}".format(path, module_line), e))
+            error.line_number = line_number
+            raise error
+        finally:
+            self.loading.pop()
+        self.interfaces[path] = interface
+        return interface
+
+    def load_imports(self, imports, search_path):
+        return [self.load(name, search_path, line_number) for line_number, name in imports]
+
+    def load_module(self, path):
+        with open(path) as source_file:
+            source, imports = split_imports(source_file.read())
+        search_path = (os.path.dirname(path),) + self.options.import_path
+        dependencies = self.load_imports(imports, search_path)
+
+        digest = hashlib.sha256()
+        for part in [self.translator_hash, get_options_key(self.options), source] + [dep.key for dep in dependencies]:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        key = digest.hexdigest()
+        stem = "{}-{}".format(os.path.splitext(os.path.basename(path))[0], key[:16])
+        interface_path = os.path.join(get_cache_dir(), stem + ".json")
+        try:
+            with open(interface_path) as interface_file:
+                interface = load_interface(json.load(interface_file))
+            if os.path.exists(interface.header):
+                return interface
+        except (OSError, ValueError, KeyError):
+            pass
+
+        interface = self.translate_module(path, source, key, stem, dependencies)
+        write_atomically(interface_path, json.dumps(dump_interface(interface), indent=2) + "\n")
+        return interface
+
+    def translate_module(self, path, source, key, stem, dependencies):
+        module = "m" + key[:12]
+        prelude = get_prelude_header(self.options)
+        options = dataclasses.replace(
+            self.options, imports=get_scope(dependencies) if dependencies else None, module=module,
+            eliminate_dead_code=False, stdlib_include=None, precompile_imports=False,
+        )
+        variables, code_lines, functional_literals = parse_program(source, ModuleInput(), options)
+        for code_line in code_lines:
+            if code_line.line_type == LineType.ASSIGNMENT and code_line.object.left_op == 'null':
+                error = TranslationError("Modules can not print")
+                error.line_number = code_line.line_number
+                raise error
+
+        includes = ['#include "{}"'.format(prelude)] + ['#include "{}"'.format(dep.header) for dep in dependencies]
+        body = []
+        for code_line in code_lines:
+            code, _ = translate_code_line(variables, functional_literals, code_line, options)
+            body.append(code)
+        header = os.path.join(get_cache_dir(), stem + ".hpp")
+        write_atomically(header, '\n'.join(["#pragma once"] + includes + [""] + body) + "\n")
+
+        own_variables = {
+            purify_name(code_line.object.left_op) for code_line in code_lines
+            if code_line.line_type == LineType.ASSIGNMENT
+        }
+        imported_variables, imported_literals = merge_exports(dependencies)
+        origins = {name: origin for name, _, _, origin in imported_variables}
+        exported_variables = tuple(
+            (name, variable.count, variable.type, key if name in own_variables else origins[name])
+            for name, variable in sorted(variables.items())
+            if variable.count > 0 and variable.type in (VariableType.NUMERIC, VariableType.TYPE)
+        )
+        exported_literals = imported_literals + tuple(
+            (name, signature, key) for name, signature in get_func_lit_signatures(code_lines).items()
+        )
+        return ModuleInterface(
+            os.path.splitext(os.path.basename(path))[0], path, key, header, tuple(dep.source for dep in dependencies),
+            exported_variables, exported_literals,
+        )
+
+
+def precompile_header(header):
+    pch = header + ".gch"
+    if os.path.exists(pch):
+        return
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(header), prefix=".staging.", suffix=".gch")
+    os.close(descriptor)
+    process = subprocess.run(
+        ["g++", "--std=c++17", "-x", "c++-header", header, "-o", temp_path],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+    )
+    if process.returncode != 0:
+        os.unlink(temp_path)
+        raise TranslationError("Can not precompile '{}':\n{}".format(header, process.stdout))
+    os.replace(temp_path, pch)
+
+
+def load_imports(imports, options):
+    loader = ModuleLoader(options)
+    interfaces = loader.load_imports(imports, options.import_path)
+    prelude = get_prelude_header(options)
+    includes = ['#include "{}"'.format(prelude)]
+    includes.extend('#include "{}"'.format(interface.header) for interface in interfaces)
+    content = '\n'.join(["#pragma once"] + includes) + "\n"
+    header = os.path.join(
+        get_cache_dir(), "imports-{}.hpp".format(hashlib.sha256(content.encode()).hexdigest()[:16])
+    )
+    if not os.path.exists(header):
+        write_atomically(header, content)
+    if options.precompile_imports:
+        precompile_header(header)
+    return dataclasses.replace(options, stdlib_include=header, imports=get_scope(interfaces))
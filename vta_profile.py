@@ -0,0 +1,160 @@
+import dataclasses
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import Counter
+
+from translate import LineType, build_cpp_code, get_code_lines, parse_program, read_template, resolve_imports
+
+LINE_TAG_TEMPLATE = re.compile(r"__vta_line<(\d+)>")
+THUNK_NAME_TEMPLATE = re.compile(r"^__thunk_(\d+)_\d+$")
+STDLIB_STRUCT_TEMPLATE = re.compile(r"^struct (__\w+)", re.M)
+TIME_REPORT_ROW_TEMPLATE = re.compile(
+    r"^ (\S.*?)\s*:\s*[\d.]+\s*\(\s*\d+%\)\s*[\d.]+\s*\(\s*\d+%\)\s*([\d.]+)", re.M
+)
+TIME_REPORT_TOTAL_TEMPLATE = re.compile(r"^ TOTAL\s*:\s*[\d.]+\s+[\d.]+\s+([\d.]+)", re.M)
+
+
+def get_template_name(class_name):
+    return class_name.split('<', 1)[0].strip()
+
+
+def count_instantiations(class_dump, stdlib_structs):
+    instantiations = Counter()
+    thunk_instantiations = Counter()
+    stdlib_instantiations = Counter()
+    for block in ("\n" + class_dump).split("\nClass ")[1:]:
+        template_name = get_template_name(block.split("\n", 1)[0])
+        if template_name == "__vta_line":
+            continue
+        tag = LINE_TAG_TEMPLATE.search(block)
+        if tag is not None:
+            line_number = int(tag.group(1))
+            instantiations[line_number] += 1
+            if THUNK_NAME_TEMPLATE.match(template_name):
+                thunk_instantiations[line_number] += 1
+        elif template_name in stdlib_structs:
+            stdlib_instantiations[template_name] += 1
+    return instantiations, thunk_instantiations, stdlib_instantiations
+
+
+def parse_time_report(time_report):
+    times = {name: float(wall) for name, wall in TIME_REPORT_ROW_TEMPLATE.findall(time_report)}
+    total = TIME_REPORT_TOTAL_TEMPLATE.search(time_report)
+    if total is not None:
+        times["TOTAL"] = float(total.group(1))
+    return times
+
+
+def get_struct_lines(code_lines):
+    struct_lines = {}
+    for line_type, atomic_obj, line_number in code_lines:
+        if line_type == LineType.ASSIGNMENT:
+            struct_lines[atomic_obj.left_op] = line_number
+        elif line_type == LineType.FUNC_LIT:
+            struct_lines["_" + atomic_obj.name] = line_number
+    return struct_lines
+
+
+def get_exclusive_times(events):
+    events = sorted(events, key=lambda event: (event["ts"], -event["dur"]))
+    exclusive_times = [event["dur"] for event in events]
+    stack = []
+    for i, event in enumerate(events):
+        while stack and events[stack[-1]]["ts"] + events[stack[-1]]["dur"] <= event["ts"]:
+            stack.pop()
+        if stack:
+            exclusive_times[stack[-1]] -= event["dur"]
+        stack.append(i)
+    return zip(events, exclusive_times)
+
+
+def clang_line_times(build_dir, struct_lines):
+    clang = shutil.which("clang++")
+    if clang is None:
+        return None
+    process = subprocess.run(
+        [clang, "-std=c++17", "-ftime-trace", "-c", "out.cpp", "-o", "clang.o"], cwd=build_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+    )
+    trace_path = os.path.join(build_dir, "clang.json")
+    if process.returncode != 0 or not os.path.exists(trace_path):
+        return None
+    with open(trace_path) as trace_file:
+        trace = json.load(trace_file)
+
+    line_times = Counter()
+    events = [event for event in trace["traceEvents"] if event.get("ph") == "X" and "dur" in event]
+    for event, exclusive_time in get_exclusive_times(events):
+        if event["name"] != "InstantiateClass":
+            continue
+        template_name = get_template_name(event.get("args", {}).get("detail", ""))
+        thunk = THUNK_NAME_TEMPLATE.match(template_name)
+        line_number = int(thunk.group(1)) if thunk is not None else struct_lines.get(template_name)
+        if line_number is not None:
+            line_times[line_number] += exclusive_time / 1e6
+    return line_times
+
+
+def format_report(raw_code_lines, times, instantiations, thunk_instantiations, stdlib_instantiations, line_times):
+    sources = {raw.line_number: "{} = {}".format(raw.left_op, raw.right_op) for raw in raw_code_lines}
+    total_instantiations = sum(instantiations.values()) + sum(stdlib_instantiations.values())
+    estimated = line_times is None
+    if estimated:
+        instantiation_time = times.get("template instantiation", 0.0)
+        line_times = {
+            line_number: instantiation_time * count / max(total_instantiations, 1)
+            for line_number, count in instantiations.items()
+        }
+    time_header = "est. time" if estimated else "clang time"
+
+    report = ["g++ -ftime-report (wall): total {:.2f}s, parsing {:.2f}s, template instantiation {:.2f}s".format(
+        times.get("TOTAL", 0.0), times.get("phase parsing", 0.0), times.get("template instantiation", 0.0)
+    ), ""]
+    report.append("{:>5}  {:>14}  {:>6}  {:>10}  {}".format("line", "instantiations", "thunks", time_header, "source"))
+    for line_number, count in sorted(instantiations.items(), key=lambda item: (-item[1], item[0])):
+        report.append("{:>5}  {:>14}  {:>6}  {:>9.3f}s  {}".format(
+            line_number, count, thunk_instantiations[line_number], line_times.get(line_number, 0.0),
+            sources.get(line_number, ""),
+        ))
+    if stdlib_instantiations:
+        report.append("")
+        report.append("stdlib: " + ", ".join(
+            "{} {}".format(name, count) for name, count in stdlib_instantiations.most_common()
+        ))
+    if estimated:
+        report.append("")
+        report.append("est. time splits g++ template instantiation time in proportion to instantiation counts.")
+    return '\n'.join(report)
+
+
+def run_profile(source_path, options, stdin):
+    with open(source_path) as source_file:
+        source = source_file.read()
+    source, options = resolve_imports(source, options)
+    raw_code_lines = get_code_lines(source)
+    options = dataclasses.replace(options, line_tags=True)
+    variables, code_lines, functional_literals = parse_program(source, stdin, options)
+    cpp_code = build_cpp_code(variables, code_lines, functional_literals, options)
+    stdlib_structs = set(STDLIB_STRUCT_TEMPLATE.findall(read_template("vta_stdlib.cpp")))
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        with open(os.path.join(build_dir, "out.cpp"), "w") as cpp_file:
+            cpp_file.write(cpp_code)
+        process = subprocess.run(
+            ["g++", "--std=c++17", "-ftime-report", "-fdump-lang-class", "-c", "out.cpp", "-o", "out.o"],
+            cwd=build_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+        )
+        if process.returncode != 0:
+            print(process.stderr)
+            return 1
+        with open(glob.glob(os.path.join(build_dir, "out.cpp.*.class"))[0]) as class_dump_file:
+            counts = count_instantiations(class_dump_file.read(), stdlib_structs)
+        line_times = clang_line_times(build_dir, get_struct_lines(code_lines))
+
+    print(format_report(raw_code_lines, parse_time_report(process.stderr), *counts, line_times))
+    return 0
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+COLLECTOR = threading.local()
+COUNTER_NAMES = ("code_lines", "tokens", "rvalues", "rvalue_nodes", "calls_translated", "bytes_emitted")
+
+
+class TranslationStats:
+    def __init__(self):
+        self.phases = {}
+        self.counters = defaultdict(int)
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    @property
+    def total_s(self):
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        counters = {name: self.counters.get(name, 0) for name in COUNTER_NAMES}
+        counters.update(self.counters)
+        return {"phases_s": dict(self.phases), "total_s": self.total_s, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def format(self):
+        rows = ["{:<24} {:>10}".format("phase", "seconds")]
+        for phase, seconds in self.phases.items():
+            rows.append("{:<24} {:>10.4f}".format(phase, seconds))
+        rows.append("{:<24} {:>10.4f}".format("total", self.total_s))
+        rows.append("")
+        rows.append("{:<24} {:>10}".format("counter", "value"))
+        for name, value in self.as_dict()["counters"].items():
+            rows.append("{:<24} {:>10}".format(name, value))
+        return '\n'.join(rows)
+
+
+def get_collector():
+    return getattr(COLLECTOR, "stats", None)
+
+
+@contextmanager
+def collect_stats(stats):
+    if stats is None:
+        yield None
+        return
+    previous = get_collector()
+    COLLECTOR.stats = stats
+    try:
+        yield stats
+    finally:
+        COLLECTOR.stats = previous
+
+
+@contextmanager
+def timed_phase(phase):
+    stats = get_collector()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_time(phase, time.perf_counter() - start)
+
+
+def count_event(name, value=1):
+    stats = get_collector()
+    if stats is not None:
+        stats.counters[name] += value
@@ -107,26 +107,23 @@ struct __concat {
 template <typename LISTA, typename LISTB>
 struct __lieq {};
 
-template <>
-struct __lieq<__list_<>, __list_<>> {
-    static const long long value = 1;
-};
-
-template <long long H, long long ...TAIL>
-struct __lieq<__list_<H, TAIL...>, __list_<>> {
-    static const long long value = 0;
-};
-
-template <long long H, long long ...TAIL>
-struct __lieq< __list_<>, __list_<H, TAIL...>> {
-    static const long long value = 0;
-};
-
-template <long long HA, long long ...TAILA, long long HB, long long ...TAILB>
-struct __lieq<__list_<HA, TAILA...>, __list_<HB, TAILB...>> {
-    static const long long head_equals = HA == HB;
-    static const long long value = (__list_<TAILA...>::length == __list_<TAILB...>::length) ?
-    (head_equals ? __lieq<__list_<TAILA...>, __list_<TAILB...>>::value : 0) : 0;
+template <long long ...A, long long ...B>
+struct __lieq<__list_<A...>, __list_<B...>> {
+    static constexpr long long equals() {
+        if (sizeof...(A) != sizeof...(B)) {
+            return 0;
+        }
+        long long items_a[] = {A..., 0};
+        long long items_b[] = {B..., 0};
+        for (size_t i = 0; i < sizeof...(A); i++) {
+            if (items_a[i] != items_b[i]) {
+                return 0;
+            }
+        }
+        return 1;
+    }
+
+    static const long long value = equals();
 };
 
 template <long long A, long long B>
@@ -209,52 +206,112 @@ struct __geq {
     static const long long value = A >= B;
 };
 
-template <long long STMT, long long A, long long B>
+template <long long LINE>
+struct __vta_line {};
+
+template <long long A>
+struct __value {
+    static const long long value = A;
+};
+
+template <typename A>
+struct __identity {
+    using type = A;
+};
+
+template <long long STMT, typename A, typename B>
 struct __if {
-    static const long long value = (STMT ? A : B);
+    static const long long value = A::value;
+};
+
+template <typename A, typename B>
+struct __if<0, A, B> {
+    static const long long value = B::value;
 };
 
 template <long long STMT, typename A, typename B>
 struct __tif {
-    using type = A;
+    using type = typename A::type;
 };
 
 template <typename A, typename B>
 struct __tif<0, A, B> {
-    using type = B;
-};
+    using type = typename B::type;
+};
+
+constexpr long long __nan_fn() { return -9223372036854775807; }
+constexpr long long __add_fn(long long a, long long b) { return a + b; }
+constexpr long long __sub_fn(long long a, long long b) { return a - b; }
+constexpr long long __mul_fn(long long a, long long b) { return a * b; }
+constexpr long long __div_fn(long long a, long long b) { return a / b; }
+constexpr long long __mod_fn(long long a, long long b) { return a % b; }
+constexpr long long __eq_fn(long long a, long long b) { return a == b; }
+constexpr long long __neq_fn(long long a, long long b) { return a != b; }
+constexpr long long __not_fn(long long a) { return !a; }
+constexpr long long __bnot_fn(long long a) { return ~a; }
+constexpr long long __and_fn(long long a, long long b) { return a && b; }
+constexpr long long __band_fn(long long a, long long b) { return a & b; }
+constexpr long long __or_fn(long long a, long long b) { return a || b; }
+constexpr long long __bor_fn(long long a, long long b) { return a | b; }
+constexpr long long __xor_fn(long long a, long long b) { return a ^ b; }
+constexpr long long __bool_fn(long long a) { return !!a; }
+constexpr long long __lshift_fn(long long a, long long b) { return a << b; }
+constexpr long long __rshift_fn(long long a, long long b) { return a >> b; }
+constexpr long long __lt_fn(long long a, long long b) { return a < b; }
+constexpr long long __leq_fn(long long a, long long b) { return a <= b; }
+constexpr long long __gt_fn(long long a, long long b) { return a > b; }
+constexpr long long __geq_fn(long long a, long long b) { return a >= b; }
+
+constexpr long long __pow_fn(long long x, long long n) {
+    long long result = 1;
+    while (n > 0) {
+        if (n & 1) {
+            result *= x;
+        }
+        n >>= 1;
+        if (n) {
+            x *= x;
+        }
+    }
+    return result;
+}
 
 
 /* generated stdlib */
 
-template<typename lst, long long x, long long acc>
-struct __count_ {
-    const static long long value =
-        __if<
-            __eq<__head<lst>::value, x>::value,
-            __count_<typename __tail<lst>::type, x, __add<acc, 1>::value>::value,
-            __count_<typename __tail<lst>::type, x, acc
-        >::value>::value;
-};
+template<typename lst, long long x>
+struct __count {};
 
-template<long long x, long long acc>
-struct __count_<__list<>::type, x, acc> {
-    const static long long value = acc;
-};
+template<long long ...T, long long x>
+struct __count<__list_<T...>, x> {
+    static constexpr long long count() {
+        long long items[] = {T..., 0};
+        long long result = 0;
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            result += items[i] == x;
+        }
+        return result;
+    }
 
-template<typename lst, long long x>
-struct __count {
-    const static long long value = __count_<lst, x, 0>::value;
+    const static long long value = count();
 };
 
 template<typename lst, long long x>
-struct __contains {
-    const static long long value = __if<__eq<__head<lst>::value, x>::value, 1, __contains<typename __tail<lst>::type, x>::value>::value;
-};
+struct __contains {};
 
-template<long long x>
-struct __contains<__list<>::type, x> {
-    const static long long value = 0;
+template<long long ...T, long long x>
+struct __contains<__list_<T...>, x> {
+    static constexpr long long contains() {
+        long long items[] = {T..., 0};
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            if (items[i] == x) {
+                return 1;
+            }
+        }
+        return 0;
+    }
+
+    const static long long value = contains();
 };
 
 template<long long x, long long y>
@@ -268,44 +325,313 @@ struct __min {
 };
 
 template<typename lst, long long i>
-struct __get {
-    const static long long value = __if<i, __get<typename __tail<lst>::type, __sub<i, 1>::value>::value, __head<lst>::value>::value;
+struct __get {};
+
+template<long long ...T, long long i>
+struct __get<__list_<T...>, i> {
+    static constexpr long long get() {
+        long long items[] = {T..., 0};
+        return 0 <= i && i < (long long) sizeof...(T) ? items[i] : __nan<>::value;
+    }
+
+    const static long long value = get();
+};
+
+template<size_t N>
+struct __chars {
+    char data[N + 1];
+};
+
+template<typename T>
+constexpr size_t __write_number(char *out, T x) {
+    unsigned long long magnitude = x < 0 ? 0 - (unsigned long long) x : (unsigned long long) x;
+    char digits[20] = {};
+    size_t count = 0;
+    size_t length = 0;
+    if (x < 0) {
+        out[length++] = '-';
+    }
+    do {
+        digits[count++] = '0' + magnitude % 10;
+        magnitude /= 10;
+    } while (magnitude);
+    while (count > 0) {
+        out[length++] = digits[--count];
+    }
+    return length;
+}
+
+template<auto x>
+struct __format_value {
+    static constexpr size_t write(char *out) {
+        size_t length = __write_number(out, x);
+        out[length++] = '\n';
+        return length;
+    }
+
+    static constexpr size_t length() {
+        char scratch[22] = {};
+        return write(scratch);
+    }
 };
 
 template<typename lst>
-struct __get<lst, -1> {
-    const static long long value = __nan<>::value;
+struct __format_list {};
+
+template<long long ...T>
+struct __format_list<__list_<T...>> {
+    static constexpr size_t write(char *out) {
+        const long long items[] = {T..., 0};
+        size_t length = 0;
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            length += __write_number(out + length, items[i]);
+            out[length++] = ' ';
+        }
+        out[length++] = '\n';
+        return length;
+    }
+
+    static constexpr size_t length() {
+        const long long items[] = {T..., 0};
+        char scratch[21] = {};
+        size_t length = 1;
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            length += __write_number(scratch, items[i]) + 1;
+        }
+        return length;
+    }
+};
+
+template<typename ...F>
+struct __output {
+    static constexpr size_t length = (F::length() + ... + 0);
+
+    static constexpr __chars<length> build() {
+        __chars<length> result = {};
+        size_t offset = 0;
+        ((offset += F::write(result.data + offset)), ...);
+        return result;
+    }
+
+    static constexpr __chars<length> chars = build();
+};
+
+template<typename ...F>
+void __write() {
+    fwrite(__output<F...>::chars.data, 1, __output<F...>::length, stdout);
+}
+
+template<typename lst, template<long long x> typename func>
+struct __map {};
+
+template<long long ...T, template<long long x> typename func>
+struct __map<__list_<T...>, func> {
+    using type = __list_<func<T>::value...>;
+};
+
+template<size_t N>
+struct __array {
+    long long items[N + 1];
+    size_t length;
+};
+
+template<typename source, typename indices = make_index_sequence<source::value.length>>
+struct __array_list {};
+
+template<typename source, size_t ...I>
+struct __array_list<source, index_sequence<I...>> {
+    using type = __list_<source::value.items[I]...>;
+};
+
+template<typename lst, template<long long x> typename pred, long long keep>
+struct __filter_items {};
+
+template<long long ...T, template<long long x> typename pred, long long keep>
+struct __filter_items<__list_<T...>, pred, keep> {
+    static constexpr __array<sizeof...(T)> select() {
+        const long long items[] = {T..., 0};
+        const long long kept[] = {(pred<T>::value != 0) == (keep != 0)..., 0};
+        __array<sizeof...(T)> result = {};
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            if (kept[i]) {
+                result.items[result.length++] = items[i];
+            }
+        }
+        return result;
+    }
+
+    static constexpr __array<sizeof...(T)> value = select();
+};
+
+template<typename lst, template<long long x> typename pred, long long keep = 1>
+struct __filter {
+    using type = typename __array_list<__filter_items<lst, pred, keep>>::type;
+};
+
+template<typename lst, template<long long x> typename func, long long (*op)(long long, long long), long long init,
+         long long right>
+struct __fold_op {};
+
+template<long long ...T, template<long long x> typename func, long long (*op)(long long, long long), long long init,
+         long long right>
+struct __fold_op<__list_<T...>, func, op, init, right> {
+    static constexpr long long fold() {
+        const long long values[] = {func<T>::value..., 0};
+        long long result = init;
+        for (size_t i = sizeof...(T); i > 0; i--) {
+            result = right ? op(values[i - 1], result) : op(result, values[i - 1]);
+        }
+        return result;
+    }
+
+    const static long long value = fold();
+};
+
+template<long long acc, template<long long a, long long x> typename func>
+struct __fold_step {
+    const static long long value = acc;
+
+    template<long long x>
+    friend __fold_step<func<acc, x>::value, func> operator<<(__fold_step, __value<x>);
+};
+
+template<typename lst, template<long long a, long long x> typename func, long long init>
+struct __fold {};
+
+template<long long ...T, template<long long a, long long x> typename func, long long init>
+struct __fold<__list_<T...>, func, init> {
+    const static long long value = decltype((__fold_step<init, func>() << ... << __value<T>()))::value;
 };
 
 template<typename lst>
-void __print() {
-    cout << lst::head << " ";
-    __print<typename lst::tail>();
-}
+struct __sum {};
 
-template<>
-void __print<__list_<>>() {
-    cout << endl;
-}
+template<long long ...T>
+struct __sum<__list_<T...>> {
+    static constexpr long long sum() {
+        const long long items[] = {T..., 0};
+        long long result = 0;
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            result += items[i];
+        }
+        return result;
+    }
 
-template<long long x>
-void __print() {
-    cout << x << endl;
-}
+    const static long long value = sum();
+};
 
-template<typename lst, template<long long x> typename func>
-struct __map {
-    using type = typename __cons<func<__head<lst>::value>::value, typename __map<typename __tail<lst>::type, func>::type>::type;
+template<long long A, typename indices>
+struct __range_ {};
+
+template<long long A, long long ...I>
+struct __range_<A, integer_sequence<long long, I...>> {
+    using type = __list_<(A + I)...>;
 };
 
-template<template<long long x> typename func>
-struct __map<typename __list<>::type, func> {
-    using type = typename __list<>::type;
+template<long long A, long long B>
+struct __range {
+    using type = typename __range_<A, make_integer_sequence<long long, (B > A ? B - A : 0)>>::type;
+};
+
+template<typename lst>
+struct __sort_items {};
+
+template<long long ...T>
+struct __sort_items<__list_<T...>> {
+    static constexpr void sift_down(long long *items, size_t root, size_t length) {
+        while (2 * root + 1 < length) {
+            size_t child = 2 * root + 1;
+            if (child + 1 < length && items[child] < items[child + 1]) {
+                child++;
+            }
+            if (items[root] >= items[child]) {
+                return;
+            }
+            long long item = items[root];
+            items[root] = items[child];
+            items[child] = item;
+            root = child;
+        }
+    }
+
+    static constexpr __array<sizeof...(T)> sort() {
+        __array<sizeof...(T)> result = {{T..., 0}, sizeof...(T)};
+        for (size_t i = sizeof...(T) / 2; i > 0; i--) {
+            sift_down(result.items, i - 1, sizeof...(T));
+        }
+        for (size_t end = sizeof...(T); end > 1; end--) {
+            long long item = result.items[0];
+            result.items[0] = result.items[end - 1];
+            result.items[end - 1] = item;
+            sift_down(result.items, 0, end - 1);
+        }
+        return result;
+    }
+
+    static constexpr __array<sizeof...(T)> value = sort();
+};
+
+template<typename lst>
+struct __sort {
+    using type = typename __array_list<__sort_items<lst>>::type;
+};
+
+template<typename lst>
+struct __reverse_items {};
+
+template<long long ...T>
+struct __reverse_items<__list_<T...>> {
+    static constexpr __array<sizeof...(T)> reverse() {
+        const long long items[] = {T..., 0};
+        __array<sizeof...(T)> result = {{}, sizeof...(T)};
+        for (size_t i = 0; i < sizeof...(T); i++) {
+            result.items[i] = items[sizeof...(T) - 1 - i];
+        }
+        return result;
+    }
+
+    static constexpr __array<sizeof...(T)> value = reverse();
+};
+
+template<typename lst>
+struct __reverse {
+    using type = typename __array_list<__reverse_items<lst>>::type;
+};
+
+template<typename lsta, typename lstb>
+struct __zip_items {};
+
+template<long long ...A, long long ...B>
+struct __zip_items<__list_<A...>, __list_<B...>> {
+    static constexpr size_t length = sizeof...(A) < sizeof...(B) ? sizeof...(A) : sizeof...(B);
+
+    static constexpr __array<2 * length> zip() {
+        const long long items_a[] = {A..., 0};
+        const long long items_b[] = {B..., 0};
+        __array<2 * length> result = {{}, 2 * length};
+        for (size_t i = 0; i < length; i++) {
+            result.items[2 * i] = items_a[i];
+            result.items[2 * i + 1] = items_b[i];
+        }
+        return result;
+    }
+
+    static constexpr __array<2 * length> value = zip();
+};
+
+template<typename lsta, typename lstb>
+struct __zip {
+    using type = typename __array_list<__zip_items<lsta, lstb>>::type;
 };
 
 template<long long x, long long n>
 struct __pow {
-    const static long long value = __mul<x, __pow<x, __sub<n, 1>::value>::value>::value;
+    const static long long value = __pow<x * x, n / 2>::value * (n % 2 ? x : 1);
+};
+
+template<long long x>
+struct __pow<x, 1> {
+    const static long long value = x;
 };
 
 template<long long x>
@@ -0,0 +1,263 @@
+import argparse
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+
+from evaluate import EvaluationError, evaluate
+from translate import (
+    ArithmeticBackend, ListBackend, ParsingError, TranslationOptions, get_code_line, parse_program, resolve_imports,
+    translate,
+)
+
+TEST_MARKER = re.compile(r"^#\s*test\s+(\S+)\s*$")
+COMPILE_TIMEOUT_S = 600
+RUN_TIMEOUT_S = 60
+
+
+class TestBlock:
+    def __init__(self, path, name, line_number, source):
+        self.path = path
+        self.name = name
+        self.line_number = line_number
+        self.source = source
+
+
+def is_output_line(line, i):
+    try:
+        code_line = get_code_line(line, i)
+    except ParsingError:
+        return False
+    return code_line is not None and code_line.left_op == 'null'
+
+
+def split_test_blocks(path, source):
+    lines = source.split('\n')
+    markers = []
+    for i, line in enumerate(lines):
+        match = TEST_MARKER.match(line)
+        if match:
+            markers.append((i, match.group(1)))
+    if not markers:
+        return [TestBlock(path, os.path.basename(path), 1, source)]
+
+    blocks = []
+    for k, (start, name) in enumerate(markers):
+        end = markers[k + 1][0] if k + 1 < len(markers) else len(lines)
+        block_lines = []
+        for i, line in enumerate(lines[:end]):
+            # Earlier blocks contribute their definitions but not their prints; blanking the skipped lines keeps
+            # the line numbers of errors pointing into the original file.
+            if i < start and is_output_line(line, i):
+                block_lines.append("")
+            else:
+                block_lines.append(line)
+        blocks.append(TestBlock(path, "test " + name, start + 1, '\n'.join(block_lines)))
+    return blocks
+
+
+def check_output(output):
+    lines = output.split('\n')
+    if lines and lines[-1] == "":
+        lines.pop()
+    if not lines:
+        return "the test printed nothing"
+    wrong = [str(i + 1) for i, line in enumerate(lines) if line != "1"]
+    if wrong:
+        return "output lines {} are not 1:\n{}".format(', '.join(wrong), output)
+    return None
+
+
+def get_result(block, status="passed", message=None):
+    return {
+        "file": block.path, "name": block.name, "line": block.line_number,
+        "status": status, "message": message, "translate_s": 0.0, "compile_s": 0.0, "run_s": 0.0,
+    }
+
+
+def check_evaluation(block, options, output):
+    source, options = resolve_imports(block.source, options)
+    _, code_lines, _ = parse_program(source, io.StringIO(), options)
+    try:
+        evaluated = evaluate(code_lines)
+    except EvaluationError:
+        # the evaluator would fall back to this very g++ build
+        return None
+    if evaluated != output:
+        return "--evaluate printed\n{}instead of\n{}".format(evaluated, output)
+    return None
+
+
+def run_test_block(block, options, compare_evaluation=False):
+    result = get_result(block)
+    start = time.perf_counter()
+    try:
+        cpp_code = translate(block.source, io.StringIO(), options)
+    except Exception as e:
+        result["translate_s"] = time.perf_counter() - start
+        result["status"] = "error"
+        result["message"] = "{}: {}".format(type(e).__name__, e)
+        return result
+    result["translate_s"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        with open(os.path.join(build_dir, "out.cpp"), "w") as cpp_file:
+            cpp_file.write(cpp_code)
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(
+                ["g++", "--std=c++17", "out.cpp", "-o", "tests"], cwd=build_dir,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=COMPILE_TIMEOUT_S,
+            )
+        except subprocess.TimeoutExpired:
+            process = None
+        except OSError as e:
+            result["status"] = "error"
+            result["message"] = "can not run g++: {}".format(e)
+            return result
+        result["compile_s"] = time.perf_counter() - start
+        if process is None or process.returncode != 0:
+            result["status"] = "error"
+            result["message"] = "compilation failed\n" + (process.stdout if process else "g++ timed out")
+            return result
+
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(
+                [os.path.join(build_dir, "tests")], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                universal_newlines=True, timeout=RUN_TIMEOUT_S,
+            )
+        except subprocess.TimeoutExpired:
+            process = None
+        result["run_s"] = time.perf_counter() - start
+    if process is None:
+        result["status"] = "failed"
+        result["message"] = "the test binary timed out"
+    elif process.returncode != 0:
+        result["status"] = "failed"
+        result["message"] = "the test binary exited with {}\n{}".format(process.returncode, process.stdout)
+    else:
+        result["message"] = check_output(process.stdout)
+        if result["message"] is None and compare_evaluation:
+            result["message"] = check_evaluation(block, options, process.stdout)
+        if result["message"] is not None:
+            result["status"] = "failed"
+    return result
+
+
+def run_tests(paths, jobs, options, name_filter="", compare_evaluation=False):
+    blocks = []
+    for path in paths:
+        with open(path) as source_file:
+            blocks.extend(split_test_blocks(path, source_file.read()))
+    blocks = [block for block in blocks if name_filter in block.name]
+    with ProcessPoolExecutor(jobs) as workers:
+        futures = [workers.submit(run_test_block, block, options, compare_evaluation) for block in blocks]
+        results = []
+        for block, future in zip(blocks, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # a crashed worker (BrokenProcessPool, MemoryError, ...) still has to show up in the reports
+                results.append(get_result(block, "error", "{}: {}".format(type(e).__name__, e)))
+        return results
+
+
+def format_results(results):
+    rows = ["{:<24} {:<7} {:>11} {:>9} {:>7}".format("test", "status", "translate s", "g++ s", "run s")]
+    for result in results:
+        rows.append("{:<24} {:<7} {:>11.4f} {:>9.3f} {:>7.3f}".format(
+            "{}:{}".format(os.path.basename(result["file"]), result["name"]), result["status"],
+            result["translate_s"], result["compile_s"], result["run_s"],
+        ))
+    failed = [result for result in results if result["status"] != "passed"]
+    for result in failed:
+        rows.append("")
+        rows.append("{} {} (line {}) {}: {}".format(
+            result["file"], result["name"], result["line"], result["status"], result["message"].rstrip()
+        ))
+    rows.append("")
+    rows.append("{} of {} tests passed".format(len(results) - len(failed), len(results)))
+    return '\n'.join(rows)
+
+
+def to_junit(results):
+    suites = ElementTree.Element("testsuites")
+    for path in dict.fromkeys(result["file"] for result in results):
+        cases = [result for result in results if result["file"] == path]
+        suite = ElementTree.SubElement(suites, "testsuite", {
+            "name": path,
+            "tests": str(len(cases)),
+            "failures": str(sum(result["status"] == "failed" for result in cases)),
+            "errors": str(sum(result["status"] == "error" for result in cases)),
+            "time": "{:.3f}".format(sum(get_total_s(result) for result in cases)),
+        })
+        for result in cases:
+            case = ElementTree.SubElement(suite, "testcase", {
+                "classname": os.path.splitext(os.path.basename(path))[0],
+                "name": result["name"],
+                "file": path,
+                "line": str(result["line"]),
+                "time": "{:.3f}".format(get_total_s(result)),
+            })
+            if result["status"] != "passed":
+                message = result["message"]
+                ElementTree.SubElement(case, "failure" if result["status"] == "failed" else "error", {
+                    "message": message.split('\n', 1)[0],
+                }).text = message
+            ElementTree.SubElement(case, "system-out").text = "translate_s={:.4f} compile_s={:.3f} run_s={:.3f}".format(
+                result["translate_s"], result["compile_s"], result["run_s"]
+            )
+    return ElementTree.tostring(suites, encoding="unicode")
+
+
+def get_total_s(result):
+    return result["translate_s"] + result["compile_s"] + result["run_s"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translate, compile and run every '# test N' block of .vta test files in parallel. "
+                    "A test passes when every line it prints is 1."
+    )
+    parser.add_argument("paths", nargs="*", default=["test.vta"], help="test files (default: test.vta)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("-k", "--filter", default="", help="only run tests whose name contains this string")
+    parser.add_argument("--junit", metavar="FILE", help="write the results as JUnit XML to FILE")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument(
+        "--evaluate", action="store_true", help="also check that the Python evaluator prints what the g++ build prints"
+    )
+    parser.add_argument(
+        "--arithmetic",
+        choices=[backend.value for backend in ArithmeticBackend],
+        default=ArithmeticBackend.STRUCT.value,
+    )
+    parser.add_argument(
+        "--lists",
+        choices=[backend.value for backend in ListBackend],
+        default=ListBackend.PACK.value,
+    )
+    args = parser.parse_args()
+    options = TranslationOptions(arithmetic=ArithmeticBackend(args.arithmetic), lists=ListBackend(args.lists))
+
+    results = run_tests(args.paths, args.jobs, options, args.filter, args.evaluate)
+    print(format_results(results))
+    if args.junit is not None:
+        with open(args.junit, "w") as junit_file:
+            junit_file.write(to_junit(results) + "\n")
+    if args.json is not None:
+        with open(args.json, "w") as json_file:
+            json.dump({"tests": results}, json_file, indent=2)
+            json_file.write("\n")
+    sys.exit(1 if any(result["status"] != "passed" for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()